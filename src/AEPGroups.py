@@ -17,7 +17,8 @@ class AEPGroup(Group):
     def __init__(self, nTurbines, nDirections=1, use_rotor_components=False, datasize=0,
                  differentiable=True, optimizingLayout=False, nSamples=0, method_dict=None,
                  wake_model=floris_wrapper, wake_model_options=None, 
-                 params_IdepVar_func=add_floris_params_IndepVarComps, params_IndepVar_args=None):
+                 params_IdepVar_func=add_floris_params_IndepVarComps, params_IndepVar_args=None,
+                 add_statistics=True):
 
         super(AEPGroup, self).__init__()
         
@@ -109,14 +110,17 @@ class AEPGroup(Group):
         # Specify how the energy statistics are computed
         self.add('powerMUX', MUX(nDirections, units=power_units))
         method = method_dict['method']
-        if method == 'dakota':
+        if not add_statistics:
+            pass  # The statistics of several layouts are computed together by MultiLayoutAEPGroup
+        elif method == 'dakota':
             self.add('AEPcomp', DakotaStatistics(nDirections, method_dict), promotes=['*'])
         elif method == 'chaospy':
             self.add('AEPcomp', ChaospyStatistics(nDirections, method_dict), promotes=['*'])
-        elif method == 'rect':
+        elif method in ['rect', 'nested', 'periodic', 'qmc', 'adaptive']:
+            # The statistics are weighted sums of the powers
             self.add('AEPcomp', RectStatistics(nTurbines, nDirections, method_dict), promotes=['*'])
         else:
-            print "Specify one of these UQ methods = ['dakota', 'chaospy', 'rect']"
+            print "Specify one of these UQ methods = ['dakota', 'chaospy', 'rect', 'nested', 'periodic', 'qmc', 'adaptive']"
             sys.exit()
 
         # connect components
@@ -127,7 +131,40 @@ class AEPGroup(Group):
             self.connect('windDirectionsDeMUX.output%i' % direction_id, 'direction_group%i.wind_direction' % direction_id)
             self.connect('windSpeedsDeMUX.output%i' % direction_id, 'direction_group%i.wind_speed' % direction_id)
             self.connect('dir_power%i' % direction_id, 'powerMUX.input%i' % direction_id)
-        self.connect('powerMUX.Array', 'dirPowers')
+        if add_statistics:
+            self.connect('powerMUX.Array', 'dirPowers')
+
+
+class MultiLayoutAEPGroup(Group):
+    """
+    Group with the AEP calculations of several layouts, the statistics of all of them are computed at once
+
+    The AEPGroup of layout i is the subgroup layout%i, whose inputs are set as
+    for a single layout, e.g. prob['layout0.turbineX']. The wind directions,
+    speeds and weights are the same for all the layouts, the statistics use the
+    windWeights of layout0. The mean and std are vectors with an entry per layout.
+    """
+
+    def __init__(self, nLayouts, nTurbines, nDirections=1, method_dict=None, **kwargs):
+
+        super(MultiLayoutAEPGroup, self).__init__()
+
+        for layout_id in range(nLayouts):
+            self.add('layout%i' % layout_id, AEPGroup(nTurbines, nDirections=nDirections, method_dict=method_dict,
+                                                      add_statistics=False, **kwargs))
+
+        method = method_dict['method']
+        if method not in ['dakota', 'chaospy', 'rect', 'nested', 'periodic', 'qmc', 'adaptive']:
+            print "Specify one of these UQ methods = ['dakota', 'chaospy', 'rect', 'nested', 'periodic', 'qmc', 'adaptive']"
+            sys.exit()
+        self.add('layoutMUX', LayoutMUX(nLayouts, nDirections))
+        self.add('AEPcomp', BatchStatistics(nLayouts, nDirections, method_dict), promotes=['*'])
+
+        # connect components
+        for layout_id in range(nLayouts):
+            self.connect('layout%i.powerMUX.Array' % layout_id, 'layoutMUX.dirPowers%i' % layout_id)
+        self.connect('layoutMUX.layoutPowers', 'layoutPowers')
+        self.connect('layout0.windWeights', 'windWeights')
 
 
 
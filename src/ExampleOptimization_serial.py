@@ -20,6 +20,14 @@ def get_args():
     parser.add_argument('-l', '--layout', default='optimized', help="specify layout ['amalia', 'optimized', 'grid', 'random', 'test']")
     parser.add_argument('--offset', default=0, type=int, help='offset for starting direction. offset=[0, 1, 2, Noffset-1]')
     parser.add_argument('--Noffset', default=10, type=int, help='number of starting directions to consider')
+    parser.add_argument('--windrose', default=None, help='wind rose file in the WindRoses format, e.g. ../WindRoses/windrose_lissett_single_average_speed.txt. Defaults to the smoothed amalia wind rose')
+    parser.add_argument('--dakota_batch', action='store_true', help='Dakota passes all the samples to one call of the analysis driver (needs Dakota 6.11 or later)')
+    parser.add_argument('--dakota_hdf5', action='store_true', help='Dakota writes the statistics and the Sobol indices to a results database (needs Dakota built with HDF5 and h5py)')
+    parser.add_argument('--dakota_statistics', default='numpy', choices=['numpy', 'dakota', 'validate'], help='For the dakota method with quadrature, compute the expansion in process, call dakota, or do both and print the differences')
+    parser.add_argument('--objective', default='mean', choices=['mean', 'mean_std', 'normal_quantile', 'normal_cvar', 'quantile', 'cvar'], help='Maximize the mean AEP, mean - k*std, the quantile or conditional value at risk of a normal AEP with the same mean and std, or those of the weighted samples')
+    parser.add_argument('--objective_k', default=1.0, type=float, help='k of the mean_std objective')
+    parser.add_argument('--objective_level', default=0.9, type=float, help='probability, between 0 and 1, of the quantile and cvar objectives, 0.9 is the P90')
+    parser.add_argument('--points_cache', action='store_true', help='Read the points from the points cache, and save them there when they are not in it')
     parser.add_argument('--verbose', action='store_true', help='Includes results for every run in the output json file')
     parser.add_argument('--version', action='version', version='Statistics convergence 0.0')
     args = parser.parse_args()
@@ -42,6 +50,9 @@ if __name__ == "__main__":
     #     'dakota_filename' = 'dakotaInput.in', applicable for dakota method
     #     'offset' = [0, 1, 2, Noffset-1]
     #     'Noffset' = 'number of starting directions to consider'
+    #     'objective' = 'mean', 'mean_std', 'normal_quantile', 'normal_cvar', 'quantile' or 'cvar', see statisticsComponents.RobustObjective
+    #     'objective_k' = k of the 'mean_std' objective
+    #     'objective_level' = probability of the quantile and cvar objectives, 0.9 for the P90
 
     # Get arguments
     args = get_args()
@@ -60,7 +71,7 @@ if __name__ == "__main__":
         dist = distributions.getWeibull()
         method_dict['distribution'] = dist
     elif method_dict['uncertain_var'] == 'direction':
-        dist = distributions.getWindRose()
+        dist = distributions.getWindRose(method_dict['windrose'])
         method_dict['distribution'] = dist
     else:
         raise ValueError('unknown uncertain_var option "%s", valid options "speed" or "direction".' %method_dict['uncertain_var'])
@@ -2,6 +2,7 @@ import numpy as np
 from openmdao.api import Group, IndepVarComp, ExecComp
 from wakeexchange.GeneralWindFarmComponents import SpacingComp, BoundaryComp
 from AEPGroups import AEPGroup
+from statisticsComponents import RobustObjective
 
 class OptAEP(Group):
     """
@@ -52,6 +53,9 @@ class OptAEP(Group):
         -------
         AEP:                scalar containing the final AEP for the wind farm
 
+        obj:                scalar containing the objective, minus the robust AEP of
+                            statisticsComponents.RobustObjective for method_dict['objective']
+
         power_directions:   1D numpy array containing the power production for each wind direction (unweighted)
 
         velocitiesTurbines: 1D numpy array of velocity at each turbine in each direction. Currently only accessible by
@@ -89,8 +93,8 @@ class OptAEP(Group):
                                          wtSeparationSquared=np.zeros(((nTurbines-1.)*nTurbines/2.))),
                  promotes=['*'])
 
-        # add objective component
-        self.add('obj_comp', ExecComp('obj = -1.*mean', mean=0.0), promotes=['*'])
+        # add objective component, the mean or a robust objective mean - c*std (method_dict['objective'])
+        self.add('obj_comp', RobustObjective(method_dict, nDirections=nDirections), promotes=['*'])
 
 
 
@@ -3,6 +3,7 @@ import matplotlib.pyplot as plt
 import json
 import distributions
 import windfarm_setup
+import quadrature
 
 
 def generate_approx_file(uncertain_variable, approxfile='approximate_at.dat'):
@@ -56,11 +57,10 @@ def read_the_approx_file(approxfile='approximated.dat'):
     return x, p
 
 
-def get_approximation(method_dict):
+def get_approximation(method_dict, dakotaApprox='approximated.dat'):
 
     # read the points from the dakota approximation file
     # Make sure this file was set in the dakota input.
-    dakotaApprox = 'approximated.dat'
     x, p = read_the_approx_file(dakotaApprox)
 
     # Modify the points according to the distribution
@@ -120,7 +120,7 @@ def get_approximation(method_dict):
             C = (C + offset) % r
             x = windfarm_setup.modifyx(x, A, B, C, r)
 
-        if dist._str() == 'Amalia windrose raw':
+        if dist._str() in ['Amalia windrose raw', 'Tabulated windrose']:
 
             bnd = dist.range()
             a = bnd[0]  # left boundary
@@ -193,7 +193,7 @@ def get_approximation(method_dict):
             C = (C + offset) % r
             x_d = windfarm_setup.modifyx(x_d, A, B, C, r)
 
-        if dist_dir._str() == 'Amalia windrose raw':
+        if dist_dir._str() in ['Amalia windrose raw', 'Tabulated windrose']:
 
             C = 225  # Location of max probability or desired starting location.
             R = b_d-a_d  # range 360
@@ -230,6 +230,30 @@ def get_approximation(method_dict):
     return winddirection_approx, windspeed_approx, power_approx
 
 
+def get_fourier_approximation(method_dict, winddirections, power, npoints=361):
+    """Fourier series approximation of the power against the direction, for the periodic method.
+
+    It is the trigonometric interpolant of the power at the equally spaced
+    directions, evaluated at npoints directions for plotting.
+    """
+
+    dist = method_dict['distribution']
+    bnd = dist.range()
+    a = bnd[0][0]  # left boundary
+    b = bnd[1][0]  # right boundary
+    r = b-a  # range 360
+
+    x = np.linspace(a, b, npoints)
+    theta = 2*np.pi*(np.asarray(winddirections)-a)/r
+    p = quadrature.trigonometric_interpolant(theta, np.asarray(power), 2*np.pi*(x-a)/r)
+
+    windspeed_approx = np.array([method_dict['windspeed_ref']])
+    winddirection_approx = x
+    power_approx = p
+
+    return winddirection_approx, windspeed_approx, power_approx
+
+
 if __name__ == "__main__":
 
     # method_dict = {'uncertain_var': 'speed', 'distribution': distributions.getWeibull()}
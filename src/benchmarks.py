@@ -0,0 +1,73 @@
+import timeit
+import argparse
+import numpy as np
+import distributions
+from statisticsComponents import ChaospyStatistics
+
+
+def benchmark_windrose_pdf(sizes=(1, 10, 100, 1000, 10000, 100000), repeat=5):
+    """Time amaliaWindRose.pdf per call against the size of the input array.
+
+    The point by point column calls the pdf once per element, which is what the
+    list comprehension in the old implementation amounted to.
+    """
+
+    windrose = distributions.amaliaWindRose()
+
+    print 'amaliaWindRose.pdf'
+    print '%10s %16s %16s %16s' % ('size', 'vectorized (s)', 'per point (s)', 'point by point (s)')
+    for size in sizes:
+        x = np.linspace(0.0, 360.0, size)
+        number = max(1, 10000 // size)
+        t = min(timeit.repeat(lambda: windrose.pdf(x), number=number, repeat=repeat)) / number
+        if size <= 10000:
+            t_loop = min(timeit.repeat(lambda: [windrose.pdf(xi) for xi in x], number=1, repeat=repeat))
+            t_loop = '%16.3e' % t_loop
+        else:
+            t_loop = '%16s' % '-'
+        print '%10d %16.3e %16.3e %s' % (size, t, t/size, t_loop)
+
+
+def benchmark_chaospy_statistics(sizes=(5, 10, 20, 40), solves=100, repeat=3):
+    """Time ChaospyStatistics, set up and solves, with the precomputed projection and with the chaospy fit.
+
+    The solves are what an optimization repeats, once per iteration, with the
+    powers of the same points.
+    """
+
+    method_dict = {'distribution': distributions.getWeibull(), 'uncertain_var': 'speed'}
+
+    print 'ChaospyStatistics'
+    print '%10s %16s %16s %16s %16s' % ('points', 'setup (s)', 'solve (s)', 'fit setup (s)', 'fit solve (s)')
+    for n in sizes:
+        power = np.linspace(0.0, 1000.0, n)
+        row = []
+        for statistics in ['projection', 'fit']:
+            method_dict['chaospy_statistics'] = statistics
+            params = {'dirPowers': power, 'method_dict': method_dict, 'windWeights': np.zeros(n)}
+            unknowns = {}
+            t_setup = min(timeit.repeat(lambda: ChaospyStatistics(n, method_dict), number=1, repeat=repeat))
+            comp = ChaospyStatistics(n, method_dict)
+            number = solves if statistics == 'projection' else max(1, solves // 10)
+            t_solve = min(timeit.repeat(lambda: comp.solve_nonlinear(params, unknowns, {}),
+                                        number=number, repeat=repeat)) / number
+            row += [t_setup, t_solve]
+        print '%10d %16.3e %16.3e %16.3e %16.3e' % tuple([n] + row)
+
+
+def get_args():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks')
+    parser.add_argument('benchmark', nargs='?', default='all', choices=['all', 'windrose_pdf', 'chaospy_statistics'],
+                        help='which benchmark to run')
+    args = parser.parse_args()
+    return args
+
+
+if __name__ == "__main__":
+
+    args = get_args()
+
+    if args.benchmark in ['all', 'windrose_pdf']:
+        benchmark_windrose_pdf()
+    if args.benchmark in ['all', 'chaospy_statistics']:
+        benchmark_chaospy_statistics()
@@ -1,23 +1,109 @@
 
+import os
 import re
 import sys
 import shutil
+import atexit
+import tempfile
+import hashlib
 import itertools
-import random
 
 
-def parseDakotaParametersFile(paramsfilename):
-    """Return parameters for application."""
+# The parsed Dakota input files, by path and modification time
+_dakota_templates = {}
+
+# The scratch directories, removed at exit
+_work_directories = []
+
+
+def removeWorkDirectories():
+    for workdir in _work_directories:
+        shutil.rmtree(workdir, True)  # Ignore the errors
+    del _work_directories[:]
+
+
+def makeWorkDirectory(prefix='run', register=atexit.register):
+    """Return a new scratch directory for the Dakota files, removed at exit.
+
+    In memory (/dev/shm) when available. Each run has its own so that several
+    can run at the same time. The removal of all the directories is registered
+    with register once, for the first one.
+    """
+
+    root = None  # The default temporary directory
+    if os.path.isdir('/dev/shm') and os.access('/dev/shm', os.W_OK):
+        root = '/dev/shm'
+    workdir = tempfile.mkdtemp(prefix='windfarm-ouu-%s-' % prefix, dir=root)
+    if not _work_directories:
+        register(removeWorkDirectories)
+    _work_directories.append(workdir)
+    return workdir
+
+
+def getWorkDirectory(method_dict):
+    """Return the scratch directory of the run, created on first use and kept in method_dict['dakota_workdir']."""
+
+    if method_dict.get('dakota_workdir') is None:
+        method_dict['dakota_workdir'] = makeWorkDirectory()
+    return method_dict['dakota_workdir']
+
+
+def makeComponentDirectory(method_dict, prefix):
+    """Return a new directory for the files of a component, in the scratch directory of the run.
+
+    Each component has its own, so that the components of a run don't overwrite
+    each other's files. They are removed with the scratch directory of the run.
+    """
+
+    return tempfile.mkdtemp(prefix='%s-' % prefix, dir=getWorkDirectory(method_dict))
+
+
+def dakotaInputNeeded(method_dict):
+    """Whether Dakota runs, to compute the points or the statistics, and needs its input file."""
+
+    return (method_dict.get('points_backend', 'dakota') == 'dakota' or method_dict['coeff_method'] != 'quadrature'
+            or method_dict.get('dakota_statistics', 'numpy') != 'numpy')
+
+
+def getDakotaInput(method_dict):
+    """Return the Dakota input file written by updateDakotaFile, in the scratch directory of the run."""
+
+    filename = os.path.basename(method_dict['dakota_filename']) + '.tmp'
+    return os.path.join(getWorkDirectory(method_dict), filename)
+
+
+def dakotaEnvironment():
+    """The environment for calling Dakota from a scratch directory.
+
+    The python analysis drivers are imported from this directory.
+    """
+
+    env = dict(os.environ)
+    here = os.path.dirname(os.path.abspath(__file__))
+    env['PYTHONPATH'] = os.pathsep.join([here] + [path for path in [env.get('PYTHONPATH')] if path])
+    return env
+
+
+def parametersRegex(batch=False):
+    """Regular expression of a line of the standard parameters format."""
 
     # setup regular expressions for parameter/label matching
     e = r'-?(?:\d+\.?\d*|\.\d+)[eEdD](?:\+|-)?\d+'  # exponential notation
     f = r'-?\d+\.\d*|-?\.\d+'                       # floating point
     i = r'-?\d+'                                    # integer
     value = e + '|' + f + '|' + i                   # numeric field
+    if batch:
+        value = r'\d+:\d+|' + value                # in batch mode the eval_id is batch_id:eval_id
     tag = r'\w+(?::\w+)*'                           # text tag field
 
     # regular expression for standard parameters format
-    standard_regex = re.compile('^\s*(' + value + ')\s+(' + tag + ')$')
+    return re.compile('^\s*(' + value + ')\s+(' + tag + ')$')
+
+
+def parseDakotaParametersFile(paramsfilename):
+    """Return parameters for application."""
+
+    standard_regex = parametersRegex()
 
     # open DAKOTA parameters file for reading
     paramsfile = open(paramsfilename, 'r')
@@ -35,6 +121,64 @@ def parseDakotaParametersFile(paramsfilename):
     return paramsdict
 
 
+def parseDakotaBatchParametersFile(paramsfilename):
+    """Return a list with the parameters of each evaluation.
+
+    In batch mode Dakota writes the parameters of all the evaluations to one
+    file, one after the other, each starting with the number of variables.
+    A file with a single evaluation gives a list of one.
+    """
+
+    batch_regex = parametersRegex(batch=True)
+    paramsfile = open(paramsfilename, 'r')
+
+    paramsdicts = []
+    for line in paramsfile:
+        m = batch_regex.match(line)
+        if m:
+            if m.group(2) == 'variables':  # The first line of an evaluation
+                paramsdicts.append({})
+            paramsdicts[-1][m.group(2)] = m.group(1)
+
+    paramsfile.close()
+
+    return paramsdicts
+
+
+def evaluationIndex(eval_id):
+    """Index in the power vector of the evaluation with the given eval_id.
+
+    In batch mode the eval_id is batch_id:eval_id and the eval_id counts the
+    evaluations of its batch only. All the samples are evaluated in the first
+    batch, so any other batch can't be mapped to the power vector.
+    """
+
+    ids = eval_id.split(':')
+    if len(ids) == 2 and int(ids[0]) != 1:
+        raise ValueError('Evaluation %s is not in the first batch, all the samples must be evaluated in a single batch.'
+                         % eval_id)
+    return int(ids[-1]) - 1
+
+
+def parseDakotaInputFile(inputfilename):
+    """Return the keywords of a Dakota input file and their values.
+
+    Only the first occurrence of a keyword is kept (descriptors appears for the
+    variables and for the responses).
+    """
+
+    inputfile = open(inputfilename, 'r')
+    inputdict = {}
+    for line in inputfile:
+        if not line.strip().startswith('#') and line.rstrip():  # Skip comment lines and blank lines
+            splitline = line.replace('=', ' ').split()
+            if splitline[0] not in inputdict:
+                inputdict[splitline[0]] = splitline[1:]
+    inputfile.close()
+
+    return inputdict
+
+
 def checknVar(nvar, paramsdict):
     """Check to make sure we have the right number of uncertain variables."""
     num_vars = 0
@@ -50,6 +194,31 @@ def writeDakotaResultsFile(
         resultfilename, resultsdict, paramsdict, active_set_vector):
     """Write results of application for Dakota."""
 
+    # write outputfile
+    outfile = open(resultfilename, 'w')
+    writeDakotaResults(outfile, resultsdict, paramsdict, active_set_vector)
+    outfile.close()
+
+
+def writeDakotaBatchResultsFile(
+        resultfilename, resultsdicts, paramsdicts, active_set_vectors):
+    """Write the results of all the evaluations of a batch for Dakota.
+
+    The results of the evaluations are separated by a line starting with #.
+    """
+
+    outfile = open(resultfilename, 'w')
+    for i, (resultsdict, paramsdict, active_set_vector) in \
+            enumerate(zip(resultsdicts, paramsdicts, active_set_vectors)):
+        if i > 0:
+            outfile.write('#\n')
+        writeDakotaResults(outfile, resultsdict, paramsdict, active_set_vector)
+    outfile.close()
+
+
+def writeDakotaResults(outfile, resultsdict, paramsdict, active_set_vector):
+    """Write the results of one evaluation to the open file."""
+
     # Make sure number of functions is as expected.
     num_fns = 0
     if 'functions' in paramsdict:
@@ -57,14 +226,11 @@ def writeDakotaResultsFile(
     if num_fns != len(resultsdict['fns']):
         raise Exception('Number of functions not as expected.')
 
-    # write outputfile
-    outfile = open(resultfilename, 'w')
-
     for func_ind in range(0, num_fns):
         # write functions
         if active_set_vector[func_ind] & 1:
             functions = resultsdict['fns']
-            outfile.write(str(functions[func_ind]) +
+            outfile.write(repr(functions[func_ind]) +  # repr keeps all the digits of a python float
                           ' f' + str(func_ind) + '\n')
 
     # write gradients
@@ -73,11 +239,9 @@ def writeDakotaResultsFile(
             grad = resultsdict['fnGrads'][func_ind]
             outfile.write('[ ')
             for deriv in grad:
-                outfile.write(str(deriv) + ' ')
+                outfile.write(repr(deriv) + ' ')
             outfile.write(']\n')
 
-    outfile.close()
-
 
 # -------------------------------------------------------------------
 #  Output Redirection
@@ -169,6 +333,34 @@ def formatAbscissasOrdinates(x, f):
 
     return x, f, n
 
+def parseDakotaTemplate(filename):
+    """Return the lines of a Dakota input file as single key dictionaries.
+
+    Comment and blank lines are removed. The file is parsed once, the result
+    is kept until the file is modified.
+    """
+
+    stamp = (os.path.abspath(filename), os.path.getmtime(filename))
+    if stamp not in _dakota_templates:
+        fr = open(filename, 'r')
+        filelines = fr.readlines()
+        fr.close()
+
+        # Get the key values for the options
+        lines = []
+        for line in filelines:
+            if not line.strip().startswith('#') and line.rstrip():  # Remove comment lines and blank lines
+                # parse input, assign values to variables
+                line = line.replace('=', ' ')  # Replace the = with a space, so the split below takes care of it.
+                splitline = line.split()
+                key = splitline[0]
+                value = splitline[1:]
+                lines.append({key: value})
+        _dakota_templates[stamp] = lines
+
+    return _dakota_templates[stamp]
+
+
 def updateDakotaFile(method_dict, sample_number, x, f):
     """Update number of quadrature (expansion) points in Dakota file,
               method for PC,
@@ -176,26 +368,11 @@ def updateDakotaFile(method_dict, sample_number, x, f):
 
     x, f, n = formatAbscissasOrdinates(x, f)  # n is number of uncertain variables
 
-    # Read in the dakota input file (assumes it is a working input file with histogram_bin_uncertain variables)
+    # The parsed dakota input file (assumes it is a working input file with histogram_bin_uncertain variables)
     # and write out an updated strip out file
     dakotaFilename = method_dict['dakota_filename']
-    filein = dakotaFilename
-    fileout = dakotaFilename + '.tmp'
-    fr = open(filein, 'r')
-    fw = open(fileout, 'w')
-    filelines = fr.readlines()
-    lines = []
-    fr.close()
-
-    # Get the key values for the options
-    for line in filelines:
-        if not line.strip().startswith('#') and line.rstrip():  # Remove comment lines and blank lines
-            # parse input, assign values to variables
-            line = line.replace('=', ' ')  # Replace the = with a space, so the split below takes care of it.
-            splitline = line.split()
-            key = splitline[0]
-            value = splitline[1:]
-            lines.append({key: value})
+    fileout = getDakotaInput(method_dict)
+    lines = [dict(line) for line in parseDakotaTemplate(dakotaFilename)]
 
     # Update the number of points and the method block
 
@@ -208,6 +385,7 @@ def updateDakotaFile(method_dict, sample_number, x, f):
                         'regression': 'expansion_order'}
     coeff_method = coeff_method_map[method_dict['coeff_method']]
     coeff_methods = ['quadrature_order', 'sparse_grid_level', 'expansion_order']
+    seed_line = None
     for i, line in enumerate(lines):
         if line.keys()[0] in coeff_methods:
             if coeff_method == 'expansion_order':
@@ -220,13 +398,13 @@ def updateDakotaFile(method_dict, sample_number, x, f):
                 # if sample_number > 9:  # The 9 works at least for the 1d case # I fixed Cross_validation in dakota src so no need for the if statement.
                 #     lines.insert(i+2, {'cross_validation': []})
                 lines.insert(i+2, {'cross_validation': []})
-                # Use a random seed
+                # Use a seed that depends on the input, set below
                 # We want a consistent seed for when dakota gets called for the points and then with the actual powers
                 # lines.insert(i+2, {'seed': ['15347']})
                 keys = [line.keys()[0] for line in lines]
                 if 'seed' not in keys:  # If we had already specified a seed don't overwrite it.
-                    seed = random.randrange(1, 100000000)  # As long as the seed is less the max int (2147483647)should be fine
-                    lines.insert(i+2, {'seed': [str(seed)]})
+                    seed_line = {'seed': []}
+                    lines.insert(i+2, seed_line)
             else:
                 lines[i] = {coeff_method: [str(sample_number)]}
             break
@@ -251,10 +429,68 @@ def updateDakotaFile(method_dict, sample_number, x, f):
             lines[i] = {'descriptors': descriptor}
             already_updated = True
 
-    # Write the new temp file
-    for line in lines:
-        towrite = line.keys()[0] + ' ' + ' '.join(line.values()[0]) + ' \n'
-        fw.write(towrite)
+    # Export the expansion coefficients, read by dakotaResults
+    keys = [line.keys()[0] for line in lines]
+    if 'polynomial_chaos' in keys and 'export_expansion_file' not in keys:
+        lines.insert(keys.index('polynomial_chaos')+1, {'export_expansion_file': ["'expansion.dat'"]})
+
+    # The statistics and the Sobol indices in the results database (Dakota built with HDF5)
+    if method_dict.get('dakota_hdf5', False):
+        keys = [line.keys()[0] for line in lines]
+        if 'results_output' not in keys:
+            lines.insert(keys.index('environment')+1, {'results_output': []})
+            lines.insert(keys.index('environment')+2, {'hdf5': []})
+        keys = [line.keys()[0] for line in lines]
+        if 'variance_based_decomp' not in keys:
+            lines.insert(keys.index('polynomial_chaos')+1, {'variance_based_decomp': []})
+
+    # Dakota runs in the scratch directory, give the full path of the fork analysis drivers
+    for i, line in enumerate(lines):
+        if 'analysis_drivers' in line:
+            drivers = []
+            for driver in line['analysis_drivers']:
+                name = driver.strip('\'"')
+                if os.path.isfile(name):
+                    driver = "'%s'" % os.path.abspath(name)
+                drivers.append(driver)
+            lines[i] = {'analysis_drivers': drivers}
+
+    # Evaluate all the samples in one call of the analysis driver (Dakota 6.11 or later)
+    if method_dict.get('dakota_batch', False):
+        keys = [line.keys()[0] for line in lines]
+        if 'batch' not in keys:
+            for i, key in enumerate(keys):
+                if key in ['fork', 'python']:
+                    lines.insert(i+1, {'batch': []})
+                    break
+        for i, line in enumerate(lines):
+            if 'analysis_drivers' in line:
+                drivers = [driver.replace(':pythonInterface', ':pythonBatchInterface') for driver in line['analysis_drivers']]
+                lines[i] = {'analysis_drivers': drivers}
+
+    # The seed is a hash of the rest of the input, the same input gives the same samples
+    if seed_line is not None:
+        rest = [line for line in lines if line is not seed_line]
+        digest = hashlib.sha1(renderDakotaInput(rest).encode('utf-8')).hexdigest()
+        seed = int(digest, 16) % 99999999 + 1  # As long as the seed is less the max int (2147483647)should be fine
+        seed_line['seed'] = [str(seed)]
+
+    # Write the new temp file, unless it is already there
+    rendered = renderDakotaInput(lines)
+    if os.path.isfile(fileout):
+        fr = open(fileout, 'r')
+        unchanged = fr.read() == rendered
+        fr.close()
+        if unchanged:
+            return
+    fw = open(fileout, 'w')
+    fw.write(rendered)
     fw.close()
 
     # shutil.move(fileout, filein)
+
+
+def renderDakotaInput(lines):
+    """The text of the Dakota input file from its lines, as given by parseDakotaTemplate."""
+
+    return ''.join(line.keys()[0] + ' ' + ' '.join(line.values()[0]) + ' \n' for line in lines)
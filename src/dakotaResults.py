@@ -0,0 +1,145 @@
+import os
+import numpy as np
+
+# Files Dakota writes in its working directory, as set up by updateDakotaFile
+tabular_file = 'dakota_tabular.dat'
+expansion_file = 'expansion.dat'  # export_expansion_file, the PCE coefficients
+hdf5_file = 'dakota_results.h5'  # results_output hdf5, only with method_dict['dakota_hdf5']
+log_file = 'logDakota.out'  # The output of Dakota, as redirected by getDakotaStatistics
+
+
+def readDakotaTabular(filename, usecols=None):
+    """Read an annotated Dakota tabular file in one go.
+
+    The first line is the header and the second column the interface, which
+    is skipped.
+
+    Returns:
+        data (np.array): shape (columns, rows), the columns after the interface
+            or those in usecols
+    """
+
+    f = open(filename, 'r')
+    ncols = len(f.readline().split())
+    f.close()
+    if usecols is None:
+        usecols = range(2, ncols)
+    return np.loadtxt(filename, skiprows=1, usecols=usecols, ndmin=2).T
+
+
+def readDakotaExpansion(filename):
+    """Read the PCE coefficients exported by Dakota.
+
+    Each line has a coefficient followed by the degree of its polynomial in
+    each variable.
+
+    Returns:
+        coeff (np.array): the coefficients
+        multi_index (np.array): shape (terms, variables)
+    """
+
+    data = np.loadtxt(filename, ndmin=2)
+    return data[:, 0], data[:, 1:].astype(int)
+
+
+def readDakotaHDF5(filename, response='power'):
+    """Read the expansion moments and the Sobol indices from the Dakota results database.
+
+    Needs h5py, only used with method_dict['dakota_hdf5'].
+
+    Returns:
+        A dictionary with the mean, std, sobol_main and sobol_total, None
+        for what is not in the file
+    """
+
+    import h5py
+
+    results = {'mean': None, 'std': None, 'sobol_main': None, 'sobol_total': None}
+    f = h5py.File(filename, 'r')
+    try:
+        methods = f['methods']
+        execution = methods[list(methods.keys())[0]]['results']['execution:1']
+        for moments in ['expansion_moments', 'moments']:
+            if moments in execution:
+                values = execution[moments][response][...]
+                results['mean'] = values[0]
+                results['std'] = values[1]
+                break
+        if 'sobol_indices' in execution:
+            sobol = execution['sobol_indices']
+            results['sobol_main'] = sobol['main_effects'][response][...]
+            results['sobol_total'] = sobol['total_effects'][response][...]
+    finally:
+        f.close()
+
+    return results
+
+
+def readDakotaLogMoments(filename):
+    """Read the mean and std that Dakota reports in its output, None if they are not there.
+
+    They follow the header line with Mean, on the line of the response or, for
+    the expansions, on the next one (expansion:).
+    """
+
+    f = open(filename, 'r')
+    lines = f.readlines()
+    f.close()
+
+    for i, line in enumerate(lines):
+        if 'Mean' in line:
+            for candidate in lines[i+1:i+3]:
+                values = candidate.split()
+                try:
+                    return float(values[1]), float(values[2])
+                except (IndexError, ValueError):
+                    pass
+
+    return None, None
+
+
+def expansionMoments(coeff, multi_index):
+    """Mean and std of a PCE of orthonormal polynomials (the normalized keyword of Dakota)."""
+
+    constant = np.all(multi_index == 0, axis=1)
+    return np.sum(coeff[constant]), np.sqrt(np.sum(coeff[~constant]**2))
+
+
+def readDakotaResults(workdir, response='power', normalized=False):
+    """Read the results of a Dakota polynomial chaos run in workdir.
+
+    The moments are those Dakota reports, in the results database or else in
+    its output. Only when Dakota reported none, and its polynomials are
+    normalized, they are computed from the PCE coefficients.
+
+    Returns:
+        A dictionary with
+            'mean', 'std' (float): the expansion moments
+            'coeff', 'multi_index' (np.array): the PCE coefficients
+            'sobol_main', 'sobol_total' (np.array): the Sobol indices, from the results database
+            'points' (np.array): the sample points, shape (variables, samples)
+        None for what Dakota didn't write
+    """
+
+    results = {'mean': None, 'std': None, 'coeff': None, 'multi_index': None,
+               'sobol_main': None, 'sobol_total': None, 'points': None}
+
+    filename = os.path.join(workdir, hdf5_file)
+    if os.path.isfile(filename):
+        results.update(readDakotaHDF5(filename, response))
+
+    filename = os.path.join(workdir, log_file)
+    if results['mean'] is None and os.path.isfile(filename):
+        results['mean'], results['std'] = readDakotaLogMoments(filename)
+
+    filename = os.path.join(workdir, expansion_file)
+    if os.path.isfile(filename):
+        results['coeff'], results['multi_index'] = readDakotaExpansion(filename)
+        if results['mean'] is None and normalized:
+            results['mean'], results['std'] = expansionMoments(results['coeff'], results['multi_index'])
+
+    filename = os.path.join(workdir, tabular_file)
+    if os.path.isfile(filename):
+        results['points'] = readDakotaTabular(filename)[:-1]  # The last column is the response
+
+    return results
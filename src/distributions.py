@@ -1,3 +1,4 @@
+import os
 import chaospy as cp
 import numpy as np
 # import matplotlib.pyplot as plt
@@ -5,6 +6,14 @@ from scipy.interpolate import interp1d
 from scipy import special
 
 
+def _horner(coeff, x):
+    """Evaluate the polynomial with coefficients coeff (highest order first) at x."""
+    y = np.zeros_like(x)
+    for c in coeff:
+        y = y*x + c
+    return y
+
+
 class amaliaWindRose(object):
     """The smoothed amalia distribution."""
 
@@ -27,22 +36,51 @@ class amaliaWindRose(object):
         # self.C = 225  # Location of max probability
 
     def pdf(self, x):
-        x = x.flatten()  # In the constructor of the distribution it gets made a 2d array for some reason. But not for cdf
-        f = self._wind_rose_poly_func()  # This will give me different results for the rectangle method. It's because the values were different
-        return f(x)
+        x = np.asarray(x, dtype=float).flatten()  # In the constructor of the distribution it gets made a 2d array for some reason. But not for cdf
+        return self._f_helper(x)
 
     def cdf(self, x):
-        # Integrate by rectangle rule
-        # dx = 0.001  # interval spacing
-        cdf = []
-        for x_i in np.array(x, copy=False, ndmin=1):  # makes it work if x is a scalar
-            dx = x_i/100.  # interval spacing
-            if x_i == 0:
-                cdf.append(0.0)
-            else:
-                X = np.arange(dx/2, x_i, dx)
-                cdf.append(np.sum(self.pdf(X)*dx))  # integration by rectangle rule
-        return np.array(cdf)
+        # Exact integral of the piecewise polynomial pdf, from the antiderivative of the fit.
+        x = np.array(x, dtype=float, ndmin=1)  # makes it work if x is a scalar
+        x = np.clip(x, self.lo, self.hi)
+        A = self.A
+        B = self.B
+        P = self.poly_int_coeff
+        t0, tA, tB = self._to_unit(np.array([self.lo, A, B]))
+        F_A = _horner(P, tA) - _horner(P, t0)  # probability of [lo, A]
+        F = np.empty(x.shape)
+        left = x <= A
+        right = x >= B
+        F[left] = _horner(P, self._to_unit(x[left])) - _horner(P, t0)
+        F[~left & ~right] = F_A  # flat over the zero probability region
+        F[right] = F_A + _horner(P, self._to_unit(x[right])) - _horner(P, tB)
+        # The fit integrates to 1 within 3e-10, normalize so that cdf(hi) = 1.
+        return F/self._total_probability()
+
+    def ppf(self, q):
+        # Invert the cdf by bisection on the antiderivative, on whichever branch q falls.
+        q = np.array(q, dtype=float, ndmin=1)
+        A = self.A
+        B = self.B
+        P = self.poly_int_coeff
+        t0, tA, tB, thi = self._to_unit(np.array([self.lo, A, B, self.hi]))
+        F_A = _horner(P, tA) - _horner(P, t0)
+        G = np.clip(q, 0.0, 1.0)*self._total_probability()
+        left = G <= F_A
+        # Values of the antiderivative to match, and the bracket in the unit variable
+        target = np.where(left, G + _horner(P, t0), G - F_A + _horner(P, tB))
+        t_lo = np.where(left, t0, tB)
+        t_hi = np.where(left, tA, thi)
+        for i in range(60):  # the bracket starts shorter than 1, so this is below machine precision
+            t_mid = 0.5*(t_lo + t_hi)
+            below = _horner(P, t_mid) < target
+            t_lo = np.where(below, t_mid, t_lo)
+            t_hi = np.where(below, t_hi, t_mid)
+        a = B
+        b = self.hi - self.lo + A
+        x = 0.5*(t_lo + t_hi)*(b-a) + (b+a)/2.
+        x[left] -= 360  # Undo the wrap of the [lo, A] branch
+        return x
 
     def str(self):
         return "Amalia windrose"
@@ -50,26 +88,39 @@ class amaliaWindRose(object):
     def bnd(self):
         return self.lo, self.hi
 
-    def _wind_rose_poly_func(self):
-        def f(x):
-            return np.array([self._f_helper(z) for z in x])
-        return f
+    # Coefficients of the polynomial fit on [-0.5, 0.5], highest order first.
+    poly_coeff = np.array([493597.250387841,
+                           -207774.160030495,
+                           -413203.013010848,
+                           158080.893880027,
+                           127607.500730722,
+                           -44242.1722820275,
+                           -17735.2623897828,
+                           5422.11156037294,
+                           1057.31910521884,
+                           -253.807324825523,
+                           -19.8973363502958,
+                           1.43458543839655,
+                           1.05778787373732])
+
+    # Its antiderivative, used by the cdf.
+    poly_int_coeff = np.polyint(poly_coeff)
 
     def _windrose_polyfit(self, x):
-        y = 493597.250387841  *np.power(x, 12) + \
-            -207774.160030495 *np.power(x, 11) + \
-            -413203.013010848 *np.power(x, 10) + \
-            158080.893880027  *np.power(x, 9) + \
-            127607.500730722  *np.power(x, 8) + \
-            -44242.1722820275 *np.power(x, 7) + \
-            -17735.2623897828 *np.power(x, 6) + \
-            5422.11156037294  *np.power(x, 5) + \
-            1057.31910521884  *np.power(x, 4) + \
-            -253.807324825523 *np.power(x, 3) + \
-            -19.8973363502958 *np.power(x, 2) + \
-            1.43458543839655  *np.power(x, 1) + \
-            1.05778787373732  *np.power(x, 0)
-        return y
+        return _horner(self.poly_coeff, x)
+
+    def _to_unit(self, x):
+        # Linear transformation from interval [a,b] to [-0.5,0.5], x <= A wraps around past 360.
+        A = self.A
+        a = self.B  # 140
+        b = self.hi - self.lo + A  # 470
+        x = np.where(x <= A, x + 360, x)
+        return (x - (b+a)/2.) / (b-a)
+
+    def _total_probability(self):
+        t0, tA, tB, thi = self._to_unit(np.array([self.lo, self.A, self.B, self.hi]))
+        P = self.poly_int_coeff
+        return _horner(P, tA) - _horner(P, t0) + _horner(P, thi) - _horner(P, tB)
 
     def _f_helper(self, x):
         # Linear transformation from interval [a,b] to [-0.5,0.5]
@@ -77,33 +128,88 @@ class amaliaWindRose(object):
         B = self.B
         a = B  # 140
         b = self.hi - self.lo + A  # 470
-        if x >= B:
-            x1 = (x - (b+a)/2.) / (b-a)
-            return self._windrose_polyfit(x1)/(b-a)  # 330
-        elif x <= A:
-            x1 = (x + 360 - (b+a)/2.) / (b-a)
-            return self._windrose_polyfit(x1)/(b-a)  # 330
-        else:
-            # If I'm only calling the pdf I should not go in here, but when calling the cdf I get in here.
-            return 0.0
+        f = np.zeros(x.shape)
+        # x >= B maps directly, x <= A wraps around past 360. Between A and B the pdf is zero.
+        # (If I'm only calling the pdf I should not get points in there, but when calling the cdf I do.)
+        inside = (x >= B) | (x <= A)
+        x1 = self._to_unit(x[inside])
+        f[inside] = self._windrose_polyfit(x1)/(b-a)  # 330
+        return f
 
     def get_zero_probability_region(self):
         return self.A, self.B
 
 
+# Process wide cache of the wind rose files, {path: (mtime, WindRoseData)}
+_windrose_cache = {}
+
+
+class WindRoseData(object):
+    """The columns of a wind rose file: direction, speed and probability."""
+
+    def __init__(self, direction, speed, probability):
+        self.direction = direction
+        self.speed = speed
+        self.probability = probability
+        for array in [direction, speed, probability]:
+            array.flags.writeable = False  # Shared by everyone using the cache, copy before modifying.
+
+
+def readWindRose(filename):
+    """Read a wind rose file in the WindRoses/ format (direction, speed, probability).
+
+    The file is only read the first time, or again if it was modified since.
+
+    Args:
+        filename (string): path to the wind rose file
+
+    Returns:
+        data (WindRoseData): the tabulated wind rose
+
+    """
+    path = os.path.abspath(filename)
+    mtime = os.path.getmtime(path)
+    try:
+        cached_mtime, data = _windrose_cache[path]
+        if cached_mtime == mtime:
+            return data
+    except KeyError:
+        pass
+
+    wind_data = np.loadtxt(path)
+    data = WindRoseData(wind_data[:, 0], wind_data[:, 1], wind_data[:, 2])
+    _windrose_cache[path] = (mtime, data)
+    return data
+
+
+def _piecewise_linear_cdf(xp, fp, x):
+    """Integral from xp[0] to x of the piecewise linear function through (xp, fp)."""
+    dx = np.diff(xp)
+    slope = np.diff(fp)/dx
+    F = np.concatenate([[0.0], np.cumsum(0.5*(fp[:-1] + fp[1:])*dx)])  # trapezoid at the nodes
+    x = np.clip(x, xp[0], xp[-1])
+    i = np.clip(np.searchsorted(xp, x, side='right') - 1, 0, len(dx)-1)
+    h = x - xp[i]
+    return F[i] + fp[i]*h + 0.5*slope[i]*h**2
+
+
 class amaliaWindRoseRaw(object):
     """The raw amalia distribution."""
 
-    def __init__(self):
+    def __init__(self, inputfile='../WindRoses/windrose_amalia_8ms.txt'):
         self.lo = 0.0
         self.hi = 360.0
-        self.inputfile = '../WindRoses/windrose_amalia_8ms.txt'
+        self.inputfile = inputfile
+        self._data = None  # The wind rose data the interpolant was built from
 
     def _wind_rose_func(self):
-        wind_data = np.loadtxt(self.inputfile)
-        direction = wind_data[:, 0]
-        speed = wind_data[:, 1]  # Speed is a constant for this file.
-        likelihood = wind_data[:, 2]
+        data = readWindRose(self.inputfile)
+        if data is self._data:
+            return self._f
+
+        direction = np.array(data.direction)
+        # speed = data.speed  # Speed is a constant for this file.
+        likelihood = np.array(data.probability)
         # Get rid of the zeros. Average this out, so distribution still integrates to 1.
         likelihood[23:26] = np.average(likelihood[23:26])
         dx = direction[1] - direction[0]  # the step 5 deg
@@ -114,26 +220,20 @@ class amaliaWindRoseRaw(object):
         # Adjust to include the point at 360, which is the same as 0.
         direction = np.append(direction, direction[-1]+dx)
         w = np.append(w, w[0])
-        f = interp1d(direction, w)
-        return f
+        self._f = interp1d(direction, w)
+        self._data = data
+        return self._f
 
     def pdf(self, x):
-        x = x.flatten()  # In the constructor of the distribution it gets made a 2d array for some reason. For this amalia class this flattening is unnecesary
+        x = np.asarray(x, dtype=float).flatten()  # In the constructor of the distribution it gets made a 2d array for some reason. For this amalia class this flattening is unnecesary
         f = self._wind_rose_func()
         return f(x)
 
     def cdf(self, x):
-        # Integrate by rectangle rule
-        # dx = 0.001  # interval spacing
-        cdf = []
-        for x_i in np.array(x, copy=False, ndmin=1):  # makes it work if x is a scalar
-            dx = x_i/100.  # interval spacing
-            if x_i == 0:
-                cdf.append(0.0)
-            else:
-                X = np.arange(dx/2, x_i, dx)
-                cdf.append(np.sum(self.pdf(X)*dx))  # integration by rectangle rule
-        return np.array(cdf)
+        # Exact integral of the linearly interpolated pdf
+        x = np.array(x, dtype=float, ndmin=1)  # makes it work if x is a scalar
+        f = self._wind_rose_func()
+        return _piecewise_linear_cdf(f.x, f.y, x)
 
     def str(self):
         return "Amalia windrose raw"
@@ -145,41 +245,39 @@ class amaliaWindRoseRaw(object):
 class amaliaWindRoseRaw01(object):
     """The raw amalia distribution."""
 
-    def __init__(self):
+    def __init__(self, inputfile='../WindRoses/windrose_amalia_8ms.txt'):
         self.lo = 0.0
         self.hi = 1.0
-        self.inputfile = '../WindRoses/windrose_amalia_8ms.txt'
+        self.inputfile = inputfile
+        self._data = None  # The wind rose data the interpolant was built from
 
     def _wind_rose_func(self):
-        wind_data = np.loadtxt(self.inputfile)
-        # direction = wind_data[:, 0]
-        # speed = wind_data[:, 1]
-        probability = wind_data[:, 2]
+        data = readWindRose(self.inputfile)
+        if data is self._data:
+            return self._f
+
+        # direction = data.direction
+        # speed = data.speed
+        probability = np.array(data.probability)
         N = len(probability)
         probability[probability == 0] = 2e-5  # think about this, # Update were the wind data is zero to the next lowest value
         probability = np.append(probability, probability[0])  # Include the value at 360, which is the same as 0.
         probability = probability*N  # normalize for the [0, 1] range.
         x = np.linspace(0, 1, N+1)
-        f = interp1d(x, probability)
-        return f
+        self._f = interp1d(x, probability)
+        self._data = data
+        return self._f
 
     def pdf(self, x):
-        x = x.flatten()  # In the constructor of the distribution it gets made a 2d array for some reason. For this amalia class this flattening is unnecesary
+        x = np.asarray(x, dtype=float).flatten()  # In the constructor of the distribution it gets made a 2d array for some reason. For this amalia class this flattening is unnecesary
         f = self._wind_rose_func()
         return f(x)
 
     def cdf(self, x):
-        # Integrate by rectangle rule
-        # dx = 0.001  # interval spacing
-        cdf = []
-        for x_i in np.array(x, copy=False, ndmin=1):  # makes it work if x is a scalar
-            dx = x_i/100.  # interval spacing
-            if x_i == 0:
-                cdf.append(0.0)
-            else:
-                X = np.arange(dx/2, x_i, dx)
-                cdf.append(np.sum(self.pdf(X)*dx))  # integration by rectangle rule
-        return np.array(cdf)
+        # Exact integral of the linearly interpolated pdf
+        x = np.array(x, dtype=float, ndmin=1)  # makes it work if x is a scalar
+        f = self._wind_rose_func()
+        return _piecewise_linear_cdf(f.x, f.y, x)
 
     def str(self):
         return "Amalia windrose raw [0,1]"
@@ -188,6 +286,76 @@ class amaliaWindRoseRaw01(object):
         return self.lo, self.hi
 
 
+class WindRose(object):
+    """A wind rose tabulated in a WindRoses/ file, for any site.
+
+    Each tabulated direction is the center of a sector of constant probability
+    density. The sector centered at 0 is split between both ends of [0, 360].
+    The density, cumulative probability and sector edges are computed once, and
+    pdf, cdf and ppf are answered by binary search on them.
+    """
+
+    def __init__(self, inputfile):
+        self.lo = 0.0
+        self.hi = 360.0
+        self.inputfile = inputfile
+
+        data = readWindRose(inputfile)
+        direction = data.direction
+        probability = data.probability
+        dx = direction[1] - direction[0]  # the sector width
+        if direction[0] != 0.0 or not np.allclose(np.diff(direction), dx):
+            raise ValueError('The wind rose directions of %s should be equally spaced starting at 0.' % inputfile)
+
+        # Sector edges, with the first sector split between both ends of [0, 360]
+        self.edges = np.concatenate([[self.lo], direction + dx/2., [self.hi]])
+        mass = np.concatenate([[probability[0]/2.], probability[1:], [probability[0]/2.]])
+        mass = mass/np.sum(mass)  # Make sure it adds up to 1.
+        self.density = mass/np.diff(self.edges)
+        self.cumulative = np.concatenate([[0.0], np.cumsum(mass)])
+        self.cumulative[-1] = 1.0
+        self.direction = direction
+        self.speed = data.speed  # The speed (or average speed) for each direction
+        self.probability = probability/np.sum(probability)  # The probability of each direction sector
+
+    def _sector(self, x):
+        return np.clip(np.searchsorted(self.edges, x, side='right') - 1, 0, len(self.density)-1)
+
+    def get_sector(self, x):
+        """Index of the tabulated direction whose sector contains x."""
+        return self._sector(x) % len(self.direction)
+
+    def pdf(self, x):
+        x = np.asarray(x, dtype=float).flatten()  # In the constructor of the distribution it gets made a 2d array for some reason.
+        f = self.density[self._sector(x)]
+        f[(x < self.lo) | (x > self.hi)] = 0.0
+        return f
+
+    def cdf(self, x):
+        x = np.array(x, dtype=float, ndmin=1)  # makes it work if x is a scalar
+        x = np.clip(x, self.lo, self.hi)
+        i = self._sector(x)
+        return self.cumulative[i] + self.density[i]*(x - self.edges[i])
+
+    def ppf(self, q):
+        q = np.array(q, dtype=float, ndmin=1)
+        q = np.clip(q, 0.0, 1.0)
+        # Searching from the left skips the zero probability sectors
+        i = np.clip(np.searchsorted(self.cumulative, q, side='left') - 1, 0, len(self.density)-1)
+        density = self.density[i]
+        dq = q - self.cumulative[i]
+        return self.edges[i] + np.where(density > 0, dq/np.where(density > 0, density, 1.0), 0.0)
+
+    def str(self):
+        return "Tabulated windrose"
+
+    def bnd(self):
+        return self.lo, self.hi
+
+    def get_windrose_file(self):
+        return self.inputfile
+
+
 class myWeibull(object):
     def __init__(self):
         self.a = 1.8
@@ -226,17 +394,19 @@ class myWeibull(object):
 
 
 class TruncatedWeibull(object):
-    def __init__(self):
-        self.a = 1.8
-        self.b = 12.552983
-        self.lo = 0.0
-        self.hi = 30.0
+    def __init__(self, a=1.8, b=12.552983, lo=0.0, hi=30.0):
+        self.a = a
+        self.b = b
+        self.lo = lo
+        self.hi = hi
         self.k = self.set_truncation_value()
 
     def set_truncation_value(self):
         """Sets k, which represents how much of the distribution is truncated"""
-        weibull = myWeibull()
-        k = weibull.cdf(self.lo) + (1.0 - weibull.cdf(self.hi))
+        a = self.a
+        b = self.b
+        F = lambda x: 1-np.exp(-(x/b)**a)  # The untruncated weibull cdf
+        k = F(self.lo) + (1.0 - F(self.hi))
         return k
 
     def get_truncation_value(self):
@@ -256,6 +426,14 @@ class TruncatedWeibull(object):
         f = 1 / (1.0-self.k) * f  # Account for the truncation
         return f
 
+    def ppf(self, q):
+        # Invert the truncated cdf
+        a = self.a
+        b = self.b
+        q = np.clip(q, 0.0, 1.0)
+        x = b * (-np.log(np.exp(-(self.lo/b)**a) - q*(1.0-self.k)))**(1.0/a)
+        return np.clip(x, self.lo, self.hi)
+
     def str(self):
         return "Truncated [%s, %s] weibull(%s, %s)" % (self.lo, self.hi, self.a, self.b)
 
@@ -307,16 +485,166 @@ class TruncatedWeibull01(object):
     def bnd(self):
         return self.lo, self.hi
 
-def getWeibull():
+class ConditionalWeibull(object):
+    """Truncated weibull of the wind speed given the wind direction.
+
+    The shape is the same for all directions. The scale of each direction sector
+    is set so that the weibull mean matches the average speed tabulated for that
+    sector in the wind rose file.
+    """
+
+    def __init__(self, windrose, a=1.8, lo=0.0, hi=30.0):
+        self.windrose = windrose  # a WindRose with the average speed per direction
+        self.a = a
+        self.lo = lo
+        self.hi = hi
+        speed = np.array(windrose.speed)
+        # Sectors without wind data have no average speed, give them the overall average.
+        missing = speed <= 0.0
+        speed[missing] = np.sum(windrose.probability*speed) / np.sum(windrose.probability[~missing])
+        self.b_sector = speed / special.gamma(1.0 + 1.0/a)
+        self.k_sector = self._truncation(self.b_sector)
+
+    def _truncation(self, b):
+        """How much of the weibull with scale b is truncated"""
+        a = self.a
+        return (1.0 - np.exp(-(self.lo/b)**a)) + np.exp(-(self.hi/b)**a)
+
+    def scale(self, direction):
+        return self.b_sector[self.windrose.get_sector(direction)]
+
+    def truncation(self, direction):
+        """The truncated probability of the speeds given the direction"""
+        return self.k_sector[self.windrose.get_sector(direction)]
+
+    def get_truncation_value(self):
+        """The truncated probability, averaged over the directions.
+
+        modify_statistics corrects with this single value, so the points of
+        windfarm_setup.getPointsConditionalSpeed weight the speeds of each
+        direction by (1 - truncation(direction))/(1 - get_truncation_value()),
+        and the mean accounts for the truncation of each sector.
+        """
+        return np.sum(self.windrose.probability*self.k_sector)
+
+    def cdf(self, x, direction):
+        # x and direction broadcast against each other
+        a = self.a
+        i = self.windrose.get_sector(direction)
+        b = self.b_sector[i]
+        x = np.clip(x, self.lo, self.hi)
+        F = np.exp(-(self.lo/b)**a) - np.exp(-(x/b)**a)  # Account for the truncation
+        F = 1 / (1.0-self.k_sector[i]) * F  # Account for the truncation
+        return F
+
+    def pdf(self, x, direction):
+        # x and direction broadcast against each other
+        a = self.a
+        i = self.windrose.get_sector(direction)
+        b = self.b_sector[i]
+        f = a/b * (x/b)**(a-1) * np.exp(-(x/b)**a)
+        f = 1 / (1.0-self.k_sector[i]) * f  # Account for the truncation
+        f = np.where((x < self.lo) | (x > self.hi), 0.0, f)
+        return f
+
+    def ppf(self, q, direction):
+        # q and direction broadcast against each other
+        a = self.a
+        i = self.windrose.get_sector(direction)
+        b = self.b_sector[i]
+        q = np.clip(q, 0.0, 1.0)
+        x = b * (-np.log(np.exp(-(self.lo/b)**a) - q*(1.0-self.k_sector[i])))**(1.0/a)
+        return np.clip(x, self.lo, self.hi)
+
+    def str(self):
+        return "Truncated [%s, %s] weibull(%s, b(direction))" % (self.lo, self.hi, self.a)
+
+    def bnd(self):
+        return self.lo, self.hi
+
+
+class JointWindRoseWeibull(object):
+    """Joint distribution of the wind direction and the wind speed given the direction.
+
+    Indexing works as for the chaospy joint of independent distributions,
+    dist[0] is the (chaospy) wind rose and dist[1] the ConditionalWeibull.
+    """
+
+    def __init__(self, windrose_dist, conditional):
+        self.dists = [windrose_dist, conditional]
+
+    def __getitem__(self, i):
+        return self.dists[i]
+
+    def __len__(self):
+        return len(self.dists)
+
+    def range(self):
+        lo_d, hi_d = self.dists[0].range()
+        lo_s, hi_s = self.dists[1].bnd()
+        return np.array([[lo_d[0], lo_s], [hi_d[0], hi_s]])
+
+    def pdf(self, x):
+        """x[0] are the directions and x[1] the speeds"""
+        return self.dists[0].pdf(x[0]) * self.dists[1].pdf(x[1], x[0])
+
+    def _str(self):
+        return "Direction conditional weibull"
+
+
+# The distributions handed out by the get* functions, keyed by their parameters.
+# The same parameters give back the same instance, so that caches downstream can
+# key on the distribution. The instances are shared by all the callers and must
+# not be modified.
+_distribution_registry = {}
+# The key of each registered distribution, by id. The registry keeps the
+# distributions alive, so their ids are never reused.
+_registry_keys = {}
+
+
+def _registered(key, build):
+    """Return the registered distribution for key, building it the first time.
+
+    The returned distribution is shared, don't modify it.
+    """
+    try:
+        return _distribution_registry[key]
+    except KeyError:
+        dist = build()
+        _distribution_registry[key] = dist
+        _registry_keys[id(dist)] = key
+        return dist
+
+
+def _file_key(filename):
+    path = os.path.abspath(filename)
+    return path, os.path.getmtime(path)
+
+
+def distribution_key(dist):
+    """Hashable key of a distribution from the get* functions, or of a chaospy joint of them."""
+    if id(dist) in _registry_keys:
+        return _registry_keys[id(dist)]
+    if len(dist) == 1:
+        raise ValueError('The distribution "%s" was not created by the get* functions.' % dist)
+    return tuple(distribution_key(dist[i]) for i in range(len(dist)))
+
+
+def getWeibull(a=1.8, b=12.552983, lo=0.0, hi=30.0):
+    return _registered(('TruncatedWeibull', a, b, lo, hi), lambda: _getWeibull(a, b, lo, hi))
+
+
+def _getWeibull(a, b, lo, hi):
 
     # my_weibull = myWeibull()
-    my_weibull = TruncatedWeibull()
+    my_weibull = TruncatedWeibull(a, b, lo, hi)
     # my_weibull = TruncatedWeibull01()
     # Set the necessary functions to construct a chaospy distribution
     Weibull = cp.construct(
         cdf=lambda self, x: my_weibull.cdf(x),
         bnd=lambda self: my_weibull.bnd(),
         pdf=lambda self, x: my_weibull.pdf(x),
+        ppf=lambda self, q: my_weibull.ppf(q),
         # mom=lambda self, k: my_weibull.mom(k),
         str=lambda self: my_weibull.str()
     )
@@ -328,22 +656,36 @@ def getWeibull():
     return weibull_dist
 
 
-def getWindRose():
+def getWindRose(windrose_file=None):
     """Gets a chaospy distribution,
         which is initialized with a distribution class I created
         and extended by it.
+
+        windrose_file: a wind rose in the WindRoses/ format. By default
+        the smoothed amalia distribution is used.
     """
+    if windrose_file is None:
+        key = ('amaliaWindRose',)
+    else:
+        key = ('WindRose',) + _file_key(windrose_file)
+    return _registered(key, lambda: _getWindRose(windrose_file))
 
-    amalia_wind_rose = amaliaWindRose()
-    # amalia_wind_rose = amaliaWindRoseRaw()  # Using this option needs updating
-    # amalia_wind_rose = amaliaWindRoseRaw01()
 
+def _getWindRose(windrose_file):
+
+    if windrose_file is None:
+        amalia_wind_rose = amaliaWindRose()
+        # amalia_wind_rose = amaliaWindRoseRaw()  # Using this option needs updating
+        # amalia_wind_rose = amaliaWindRoseRaw01()
+    else:
+        amalia_wind_rose = WindRose(windrose_file)
 
     # Set the necessary functions to construct a chaospy distribution
     windRose = cp.construct(
         cdf=lambda self, x: amalia_wind_rose.cdf(x),
         bnd=lambda self: amalia_wind_rose.bnd(),
         pdf=lambda self, x: amalia_wind_rose.pdf(x),
+        ppf=lambda self, q: amalia_wind_rose.ppf(q),
         str=lambda self: amalia_wind_rose.str()
     )
 
@@ -356,11 +698,27 @@ def getWindRose():
     # Dynamically add method
     if amalia_wind_rose.str() == 'Amalia windrose':
         windrose_dist.get_zero_probability_region = amalia_wind_rose.get_zero_probability_region
-
+    if amalia_wind_rose.str() == 'Tabulated windrose':
+        windrose_dist.get_windrose_file = amalia_wind_rose.get_windrose_file
+        windrose_dist.windrose = amalia_wind_rose  # The average speeds for the conditional weibull
 
     return windrose_dist
 
 
+def getJointWindRoseWeibull(windrose_file='../WindRoses/windrose_amalia_directionally_averaged_speeds.txt'):
+    """Gets the joint distribution of the wind direction and speed,
+        with the weibull scale depending on the direction through
+        the average speeds in windrose_file.
+    """
+
+    def build():
+        windrose_dist = getWindRose(windrose_file)
+        conditional = ConditionalWeibull(windrose_dist.windrose)
+        return JointWindRoseWeibull(windrose_dist, conditional)
+
+    return _registered(('JointWindRoseWeibull',) + _file_key(windrose_file), build)
+
+
 # # Make nice plots of the distributions
 # import prettify
 # import matplotlib as mpl
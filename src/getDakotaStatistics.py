@@ -1,89 +1,49 @@
 
+import os
 import subprocess
 import sys
 import numpy as np
-from dakotaInterface import RedirectOutput
+from dakotaInterface import RedirectOutput, dakotaEnvironment, parseDakotaInputFile
+from dakotaResults import readDakotaResults, expansion_file, hdf5_file, log_file
 
-def getDakotaStatistics(dakotaFile):
+def getDakotaStatistics(dakotaInput):
 
-    dakotaInput = dakotaFile + '.tmp'
+    # The results of a previous run in this directory
+    for filename in [expansion_file, hdf5_file]:
+        if os.path.isfile(filename):
+            os.remove(filename)
 
     print 'Calling Dakota...'
     # Pipe the output
-    log = 'logDakota.out'
+    log = log_file
     err = log  # will append the error to the output
     with RedirectOutput(log, err):
         # dakotaInput = '--version'
         subprocess.check_call(['dakota', dakotaInput], stdout=sys.stdout,
-                              stderr=sys.stderr)
+                              stderr=sys.stderr, env=dakotaEnvironment())
 
     print 'finished calling Dakota.'
 
-    # Postprocess the results
-    mean, std, coeff = postprocess(dakotaInput)
-    return mean, std, coeff
-
-
-def postprocess(dakotaFile):
-    """Read the Mean and the coefficients from the Dakota output."""
-
-    # Read the input file to determine which case we ran quadrature or regression
-    # Then we know how the read the statistics from the output file
-    skipline = True
-    f = open(dakotaFile, 'r')
-    for line in f:
-        if 'expansion_order' in line and not line.strip().startswith('#'):
-            skipline = False
-            break
-        if 'sampling' in line and not line.strip().startswith('#'):
-            skipline = False
-            break
-    f.close()
-
-    filename = 'logDakota.out'
-
-    with open(filename, 'r') as f:
-        # Find the coefficients
-        # while True:
-        #     line = f.readline()
-        #     if 'coefficient' in line:
-        #         break
-        #     if not line: break
-        #
-        # # Read the coefficients
-        # f.readline()
-        coeff = []
-        # while True:
-        #     try:
-        #         coeff.append(float(f.readline().split()[0]))
-        #     except ValueError:
-        #         break
-
-        # Find the function
-        while True:
-            line = f.readline()
-            if 'Mean' in line:
-                # function value
-                if skipline:
-                    f.readline()
-                line = f.readline()
-                mean = float(line.split()[1])
-                std = float(line.split()[2])
-                break
-            if not line: break
-
-    return np.array(mean), np.array(std), np.array(coeff)
+    # The moments reported by Dakota, from the normalized expansion if it reported none
+    normalized = 'normalized' in parseDakotaInputFile(dakotaInput)
+    results = readDakotaResults('.', normalized=normalized)
+    if results['mean'] is None:
+        raise IOError('Dakota reported no moments in %s or %s, and there is no %s of normalized polynomials in %s.'
+                      % (hdf5_file, log, expansion_file, os.getcwd()))
+    return results
 
 
 if __name__ == '__main__':
 
-    # dakotaFileName = 'dakotaAEP.in'
-    dakotaFileName = sys.argv[1]
+    # dakotaInput = 'dakotaAEP.in.tmp'
+    dakotaInput = sys.argv[1]
 
-    mean, std, coeff = getDakotaStatistics(dakotaFileName)
-    # print 'mean', mean
-    # print 'chaos coefficients', coeff
+    # Dakota and the files below are in the directory of the input file
+    os.chdir(os.path.dirname(os.path.abspath(dakotaInput)))
+    results = getDakotaStatistics(os.path.basename(dakotaInput))
+    # print 'mean', results['mean']
+    # print 'chaos coefficients', results['coeff']
 
     # Write out the calculated AEP to be read by the DakotaAEP Component
-    np.savetxt('mean.txt', [mean], header='mean power')  # put in [] It doesn't like to write a scalar
-    np.savetxt('std.txt', [std], header='std power')
+    np.savetxt('mean.txt', [results['mean']], header='mean power')  # put in [] It doesn't like to write a scalar
+    np.savetxt('std.txt', [results['std']], header='std power')
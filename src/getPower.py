@@ -12,7 +12,22 @@
 # necessary python modules
 import sys
 import dakotaInterface
-import numpy as np
+
+
+def readPower(filename='powerInput.txt'):
+    """Read the power vector written by DakotaStatistics, or None when only getting the sample points.
+
+    Read without numpy, which is the slowest part of starting this script.
+    """
+
+    try:
+        f = open(filename)
+    except IOError:
+        return None
+    f.readline()  # Skip the header
+    power = [float(line) for line in f if line.strip()]
+    f.close()
+    return power
 
 
 def main():
@@ -20,8 +35,10 @@ def main():
     # ----------------------------
     # Parse DAKOTA parameters file
     # ----------------------------
+    # With the batch keyword in the interface block Dakota passes all the
+    # evaluations at once, otherwise the list has a single evaluation.
     paramsfile = sys.argv[1]
-    paramsdict = dakotaInterface.parseDakotaParametersFile(paramsfile)
+    paramsdicts = dakotaInterface.parseDakotaBatchParametersFile(paramsfile)
 
     # -------- Modify here for your problem -------- #
 
@@ -33,31 +50,33 @@ def main():
     # nVarUncertain = 1
     # dakotaInterface.checknVar(nVarUncertain, paramsdict)
 
-    active_set_vector = [int(paramsdict['ASV_1:power'])]
+    active_set_vectors = [[int(paramsdict['ASV_1:power'])] for paramsdict in paramsdicts]
 
     # -----------------------------
     # Execute your application
     # -----------------------------
 
-    try:
-        power = np.atleast_1d(np.loadtxt('powerInput.txt'))
-        index = int(paramsdict['eval_id']) - 1
-        power_i = power[index]
-
-    except IOError:  # This is for the case when we are only getting the sample points.
+    # The power vector is read once for all the evaluations
+    power = readPower()
+    if power is None:  # This is for the case when we are only getting the sample points.
         print '\n\nWARNING: missing powerInput.txt\n\n'
-        index = int(paramsdict['eval_id']) - 1
-        power_i = index  # -1.0  # np.nan
 
-    resultsdict = {'fns': [power_i], 'fnGrads': []}
+    resultsdicts = []
+    for paramsdict in paramsdicts:
+        index = dakotaInterface.evaluationIndex(paramsdict['eval_id'])  # batch_id:eval_id in batch mode
+        if power is None:
+            power_i = index  # -1.0  # np.nan
+        else:
+            power_i = power[index]
+        resultsdicts.append({'fns': [power_i], 'fnGrads': []})
 
     # ----------------------------
     # Return the results to DAKOTA
     # ----------------------------
 
     resultsfile = sys.argv[2]
-    dakotaInterface.writeDakotaResultsFile(
-        resultsfile, resultsdict, paramsdict, active_set_vector)
+    dakotaInterface.writeDakotaBatchResultsFile(
+        resultsfile, resultsdicts, paramsdicts, active_set_vectors)
 
 
 if __name__ == '__main__':
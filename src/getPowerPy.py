@@ -1,12 +1,33 @@
-
 # This is the case for the direct python interface.
 
-def pythonInterface(**kwargs):
+# The power vector, read once per Dakota run. Dakota keeps this module loaded
+# between the evaluations, and starts again for every new power vector.
+power = None
+
+
+def readPower():
 
     # import numpy as np  # It doesn't like it because dakota and my python numpy are inconsistent
     # http://stackoverflow.com/questions/35006614/what-does-symbol-not-found-expected-in-flat-namespace-actually-mean
     # The code inside the try statement doesn't use numpy to read the file anymore.
 
+    global power
+    if power is None:
+        try:
+            f = open('powerInput.txt')
+            f.readline()  # Skip the header
+            power = [float(line) for line in f if line.strip()]
+            f.close()
+
+        except IOError:  # This is for the case when we are only getting the sample points.
+            print '\n\nWARNING: missing powerInput.txt\n\n'
+            power = []
+
+    return power
+
+
+def pythonInterface(**kwargs):
+
     paramsdict = kwargs
 
     num_fns = int(paramsdict['functions'])
@@ -15,18 +36,19 @@ def pythonInterface(**kwargs):
     for i in range(num_fns):
         active_set_vector.append(int(paramsdict['asv'][i]))
 
-    try:
-        f = open('powerInput.txt')
-        f.readline()  # Skip the header
-        lines = f.readlines()
-        index = int(paramsdict['currEvalId']) - 1
-        power_i = float(lines[index])
-
-    except IOError:  # This is for the case when we are only getting the sample points.
-        print '\n\nWARNING: missing powerInput.txt\n\n'
-        index = int(paramsdict['currEvalId']) - 1
+    index = int(paramsdict['currEvalId']) - 1
+    power = readPower()
+    if power:
+        power_i = power[index]
+    else:  # Only getting the sample points
         power_i = index  # -1.0  # np.nan
 
     resultsdict = {'fns': [power_i], 'fnGrads': []}
 
     return resultsdict
+
+
+def pythonBatchInterface(batch):
+    """The python interface with the batch keyword, Dakota passes the list of all the evaluations."""
+
+    return [pythonInterface(**paramsdict) for paramsdict in batch]
@@ -0,0 +1,171 @@
+import os
+import hashlib
+import numpy as np
+import distributions
+import dakotaInterface
+
+# Points and weights of previous runs, saved as compressed .npz files named by
+# the hash of everything that determines them. Only used with method_dict['points_cache'] = True.
+cache_dir = os.environ.get('WINDFARM_OUU_CACHE',
+                           os.path.join(os.path.expanduser('~'), '.cache', 'windfarm-ouu', 'points'))
+max_size = 200*1024*1024  # bytes, the least recently used files are removed beyond this
+version = 4  # Increase when the format of the files changes, to invalidate the old files
+
+# The modules that generate the points, their source is part of the key so
+# that any change to them invalidates the cached points.
+source_modules = ['windfarm_setup', 'quadrature', 'qmc', 'distributions', 'getSamplePoints', 'dakotaInterface']
+_source_hash = None
+
+# The method_dict options the points depend on, besides the distribution and n.
+key_options = ['method', 'coeff_method', 'uncertain_var', 'offset', 'Noffset',
+               'windspeed_ref', 'winddirection_ref', 'speed_rule', 'points_backend',
+               'nested_rule', 'kronrod_points', 'periodic_weights',
+               'qmc_sequence', 'qmc_replicates', 'qmc_seed', 'dakota_batch',
+               'dakota_hdf5', 'dakota_statistics']
+
+
+def get_source_hash():
+    """Hash of the source of the modules in source_modules, computed once."""
+
+    global _source_hash
+    if _source_hash is None:
+        directory = os.path.dirname(os.path.abspath(__file__))
+        sha = hashlib.sha1()
+        for module in source_modules:
+            f = open(os.path.join(directory, module + '.py'), 'rb')
+            sha.update(f.read())
+            f.close()
+        _source_hash = sha.hexdigest()
+    return _source_hash
+
+
+def get_key(method_dict, n):
+    """Hash of the inputs of windfarm_setup.getPoints, or None if they can't be hashed.
+
+    The dakota method also depends on the content of the dakota input file,
+    and all the methods on the source of the modules that generate the points.
+    """
+
+    try:
+        dist_key = distributions.distribution_key(method_dict['distribution'])
+    except ValueError:
+        return None  # A distribution not created by the get* functions
+
+    options = [(option, method_dict.get(option)) for option in key_options]
+    inputs = [version, get_source_hash(), n, dist_key, options]
+    if method_dict['method'] == 'dakota':
+        f = open(method_dict['dakota_filename'], 'r')
+        inputs.append(f.read())
+        f.close()
+
+    return hashlib.sha1(repr(inputs).encode('utf-8')).hexdigest()
+
+
+def load(key, method_dict):
+    """Return the cached points for key, or None.
+
+    For the dakota method the histogram bins and their quadrature are put back
+    in method_dict['dakota_histogram'], and the cached dakota input file (.tmp),
+    if Dakota runs, is written back to the scratch directory of the run.
+    """
+
+    filename = os.path.join(cache_dir, key + '.npz')
+    try:
+        data = np.load(filename)
+    except IOError:
+        return None
+
+    points = {'winddirections': data['winddirections'], 'windspeeds': data['windspeeds']}
+    if data['has_weights']:
+        points['weights'] = data['weights']
+    else:
+        points['weights'] = np.array(None)
+    if 'histogram_abscissas' in data.files:
+        method_dict['dakota_histogram'] = {'abscissas': data['histogram_abscissas'],
+                                           'ordinates': data['histogram_ordinates'],
+                                           'quadrature_order': int(data['quadrature_order']),
+                                           'points': data['histogram_points'],
+                                           'weights': np.array(None)}
+        if 'histogram_weights' in data.files:
+            method_dict['dakota_histogram']['weights'] = data['histogram_weights']
+    if 'dakota_input' in data.files:
+        f = open(dakotaInterface.getDakotaInput(method_dict), 'w')
+        f.write(str(data['dakota_input']))
+        f.close()
+    data.close()
+
+    os.utime(filename, None)  # Mark as recently used
+    return points
+
+
+def save(key, points, method_dict):
+    """Save the points for key and trim the cache to max_size."""
+
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            if not os.path.isdir(cache_dir):  # Somebody else may have created it
+                raise
+
+    arrays = {'winddirections': points['winddirections'], 'windspeeds': points['windspeeds']}
+    weights = np.asarray(points['weights'])
+    arrays['has_weights'] = weights.dtype != object  # The dakota regression has no weights
+    if arrays['has_weights']:
+        arrays['weights'] = weights
+    if method_dict['method'] == 'dakota':
+        histogram = method_dict['dakota_histogram']
+        arrays['histogram_abscissas'] = histogram['abscissas']
+        arrays['histogram_ordinates'] = histogram['ordinates']
+        arrays['quadrature_order'] = histogram['quadrature_order']
+        arrays['histogram_points'] = histogram['points']
+        if histogram['weights'].dtype != object:  # The dakota regression has no weights
+            arrays['histogram_weights'] = histogram['weights']
+        if dakotaInterface.dakotaInputNeeded(method_dict):
+            f = open(dakotaInterface.getDakotaInput(method_dict), 'r')
+            arrays['dakota_input'] = f.read()
+            f.close()
+
+    # Write to a temporary file first so that concurrent runs never read a partial file
+    filename = os.path.join(cache_dir, key + '.npz')
+    tmpname = '%s.%d.tmp' % (filename, os.getpid())
+    f = open(tmpname, 'wb')
+    np.savez_compressed(f, **arrays)
+    f.close()
+    os.rename(tmpname, filename)
+
+    evict()
+
+
+def evict():
+    """Remove the least recently used files until the cache is below max_size."""
+
+    files = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.npz'):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        files.append((stat.st_mtime, stat.st_size, path))
+
+    size = sum(f[1] for f in files)
+    for mtime, fsize, path in sorted(files):
+        if size <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        size -= fsize
+
+
+def clear():
+    """Remove all the cached points."""
+
+    if os.path.isdir(cache_dir):
+        for name in os.listdir(cache_dir):
+            if name.endswith('.npz'):
+                os.remove(os.path.join(cache_dir, name))
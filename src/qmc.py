@@ -0,0 +1,116 @@
+import numpy as np
+
+# Sobol parameters of the dimensions after the first (Joe and Kuo, new-joe-kuo-6.21201):
+# degree s of the primitive polynomial, its coefficients a, and the initial direction numbers m.
+sobol_parameters = [
+    (1, 0, [1]),
+    (2, 1, [1, 3]),
+    (3, 1, [1, 3, 1]),
+    (3, 2, [1, 1, 1]),
+    (4, 1, [1, 1, 3, 3]),
+    (4, 4, [1, 3, 5, 13]),
+    (5, 2, [1, 1, 5, 5, 17]),
+    (5, 4, [1, 1, 5, 5, 5]),
+    (5, 7, [1, 1, 7, 11, 19]),
+    (5, 11, [1, 1, 5, 1, 1]),
+    (5, 13, [1, 1, 1, 3, 11]),
+    (5, 14, [1, 3, 5, 5, 31]),
+    (6, 1, [1, 3, 3, 9, 7, 49]),
+    (6, 13, [1, 1, 1, 15, 21, 21]),
+    (6, 16, [1, 3, 1, 13, 27, 49]),
+]
+
+bits = 32  # binary digits of the points
+
+primes = [2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37, 41, 43, 47, 53]
+
+
+def sobol_direction_numbers(d):
+    """The direction numbers of the first d dimensions, as a (d, bits) array of binary digits.
+
+    Row j, column i holds the digits of v_{j,i}, the most significant first.
+    """
+    if d > len(sobol_parameters) + 1:
+        raise ValueError('The Sobol sequence is implemented up to %s dimensions.' % (len(sobol_parameters) + 1))
+
+    V = np.zeros((d, bits), dtype=np.int64)
+    V[0] = 1 << np.arange(bits-1, -1, -1)  # The first dimension is the van der Corput sequence
+    for j in range(1, d):
+        s, a, m = sobol_parameters[j-1]
+        for i in range(bits):
+            if i < s:
+                V[j, i] = m[i] << (bits-1-i)
+            else:
+                v = V[j, i-s] ^ (V[j, i-s] >> s)
+                for k in range(1, s):
+                    if (a >> (s-1-k)) & 1:
+                        v ^= V[j, i-k]
+                V[j, i] = v
+    return V
+
+
+def linear_matrix_scramble(V, rng):
+    """Left multiply the digits of the direction numbers by random lower triangular matrices (one per dimension)."""
+    d = V.shape[0]
+    shifts = np.arange(bits-1, -1, -1)
+    digits = (V[:, :, None] >> shifts) & 1  # (d, column, digit)
+    scrambled = np.zeros_like(V)
+    for j in range(d):
+        L = np.tril(rng.randint(0, 2, size=(bits, bits)), -1) + np.eye(bits, dtype=np.int64)
+        D = L.dot(digits[j].T) % 2  # (digit, column)
+        scrambled[j] = (D << shifts[:, None]).sum(axis=0)
+    return scrambled
+
+
+def sobol(n, d, rng=None):
+    """n points of the d dimensional Sobol sequence in [0, 1)^d.
+
+    With a random generator rng the points are scrambled (linear matrix
+    scramble and a random digital shift), so that each replicate is an unbiased
+    estimate.
+    """
+    V = sobol_direction_numbers(d)
+    shift = np.zeros(d, dtype=np.int64)
+    if rng is not None:
+        V = linear_matrix_scramble(V, rng)
+        shift = rng.randint(0, 2**31, size=d).astype(np.int64)*2 + rng.randint(0, 2, size=d)
+
+    # Gray code order, point k differs from point k-1 by the direction number of the lowest zero bit of k-1
+    X = np.zeros((n, d), dtype=np.int64)
+    x = shift.copy()
+    for k in range(n):
+        X[k] = x
+        c = 0
+        while (k >> c) & 1:
+            c += 1
+        x = x ^ V[:, c]
+    return (X + 0.5) / 2.0**bits
+
+
+def halton(n, d, rng=None):
+    """n points of the d dimensional Halton sequence in [0, 1)^d.
+
+    With a random generator rng every digit of every dimension is scrambled
+    by an independent random permutation.
+    """
+    if d > len(primes):
+        raise ValueError('The Halton sequence is implemented up to %s dimensions.' % len(primes))
+
+    X = np.zeros((n, d))
+    k = np.arange(n)
+    for j in range(d):
+        b = primes[j]
+        ndigits = int(np.ceil(np.log(n+1) / np.log(b))) + 1
+        remainder = k.copy()
+        factor = 1.0/b
+        for i in range(ndigits):
+            digit = remainder % b
+            if rng is not None:
+                digit = rng.permutation(b)[digit]
+            X[:, j] += digit*factor
+            remainder = remainder // b
+            factor /= b
+        if rng is not None:
+            # The remaining digits, all zero before the permutation, are random
+            X[:, j] += rng.uniform(0, factor*b, size=n)
+    return X
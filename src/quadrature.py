@@ -0,0 +1,264 @@
+import numpy as np
+
+
+def composite_gauss_legendre(a, b, panels=200, order=10):
+    """Nodes and weights of a composite Gauss-Legendre rule on [a, b].
+
+    Used to discretize a continuous measure before computing its Gauss rule.
+    """
+    x, w = np.polynomial.legendre.leggauss(order)
+    edges = np.linspace(a, b, panels+1)
+    h = np.diff(edges)
+    t = (edges[:-1, None] + h[:, None]*(x + 1)/2.).flatten()
+    dt = (h[:, None]*w/2.).flatten()
+    return t, dt
+
+
+def stieltjes(t, lam, n):
+    """Recurrence coefficients of the monic orthogonal polynomials of a discrete measure.
+
+    Args:
+        t (np.array): the support of the measure, shape (M,)
+        lam (np.array): the weights of the measure, shape (..., M). Leading
+            dimensions are independent measures on the same support.
+        n (int): number of recurrence coefficients
+
+    Returns:
+        alpha, beta (np.array): shape (..., n). beta[..., 0] is the total mass.
+
+    """
+    lam = np.asarray(lam, dtype=float)
+    shape = lam.shape[:-1]
+    alpha = np.zeros(shape + (n,))
+    beta = np.zeros(shape + (n,))
+
+    p_prev = np.zeros(lam.shape)
+    p = np.ones(lam.shape)
+    norm = np.sum(lam, axis=-1)
+    beta[..., 0] = norm
+    for k in range(n):
+        alpha[..., k] = np.sum(lam*t*p*p, axis=-1)/norm
+        if k == n-1:
+            break
+        p_next = (t - alpha[..., k, None])*p - beta[..., k, None]*p_prev
+        norm_next = np.sum(lam*p_next*p_next, axis=-1)
+        beta[..., k+1] = norm_next/norm
+        p_prev, p, norm = p, p_next, norm_next
+    return alpha, beta
+
+
+def golub_welsch(alpha, beta):
+    """Gauss nodes and weights from the recurrence coefficients (batched over leading dimensions)."""
+    n = alpha.shape[-1]
+    J = np.zeros(alpha.shape + (n,))
+    i = np.arange(n)
+    J[..., i, i] = alpha
+    off = np.sqrt(beta[..., 1:])
+    J[..., i[:-1], i[1:]] = off
+    J[..., i[1:], i[:-1]] = off
+    x, v = np.linalg.eigh(J)
+    w = beta[..., 0, None]*v[..., 0, :]**2
+    return x, w
+
+
+def gauss(t, lam, n):
+    """n point Gauss rule of the discrete measure (t, lam), batched over the leading dimensions of lam.
+
+    The support is mapped to [-1, 1] for the recurrence, which keeps the monic
+    polynomials well scaled.
+    """
+    t = np.asarray(t, dtype=float)
+    a = np.min(t)
+    b = np.max(t)
+    s = 2.0*(t-a)/(b-a) - 1.0
+    alpha, beta = stieltjes(s, lam, n)
+    x, w = golub_welsch(alpha, beta)
+    x = a + (b-a)*(x+1)/2.
+    return x, w
+
+
+def orthonormal_polynomials(alpha, beta, x):
+    """Values of the orthonormal polynomials of degree 0..n-1 at x, shape (x.size, n).
+
+    alpha and beta are the n recurrence coefficients of the monic polynomials.
+    """
+    x = np.asarray(x, dtype=float)
+    n = alpha.size
+    psi = np.zeros((x.size, n))
+    psi[:, 0] = 1.0/np.sqrt(beta[0])
+    for k in range(n-1):
+        previous = psi[:, k-1]*np.sqrt(beta[k]) if k > 0 else 0.0
+        psi[:, k+1] = ((x - alpha[k])*psi[:, k] - previous)/np.sqrt(beta[k+1])
+    return psi
+
+
+def histogram_measure(edges, density, n):
+    """Discrete measure with the moments up to degree 2n+1 of a histogram bin distribution, normalized.
+
+    The density is constant on each bin, so a Gauss-Legendre rule of n+1 points
+    per bin is exact.
+    """
+    edges = np.asarray(edges, dtype=float)
+    density = np.asarray(density, dtype=float)
+    x, w = np.polynomial.legendre.leggauss(n+1)
+    h = np.diff(edges)
+    t = (edges[:-1, None] + h[:, None]*(x + 1)/2.).flatten()
+    lam = ((density*h)[:, None]*w/2.).flatten()
+    lam = lam/np.sum(lam)
+    return t, lam
+
+
+def histogram_gauss(edges, density, n):
+    """n point Gauss rule of a histogram bin distribution, with normalized weights."""
+    t, lam = histogram_measure(edges, density, n)
+    return gauss(t, lam, n)
+
+
+def histogram_recurrence(edges, density, n):
+    """Recurrence coefficients of the n first orthonormal polynomials of a histogram bin distribution.
+
+    The polynomials are in s = 2*(x-a)/(b-a) - 1, a and b are also returned.
+    """
+    t, lam = histogram_measure(edges, density, n)
+    a = np.min(t)
+    b = np.max(t)
+    s = 2.0*(t-a)/(b-a) - 1.0
+    alpha, beta = stieltjes(s, lam, n)
+    return alpha, beta, a, b
+
+
+def histogram_polynomials(edges, density, n, x):
+    """Values at x of the orthonormal polynomials of degree 0..n-1 of a histogram bin distribution, shape (x.size, n)."""
+    alpha, beta, a, b = histogram_recurrence(edges, density, n)
+    return orthonormal_polynomials(alpha, beta, 2.0*(np.asarray(x, dtype=float)-a)/(b-a) - 1.0)
+
+
+def histogram_pce(edges, density, n):
+    """n point Gauss rule of a histogram bin distribution and its orthonormal polynomials.
+
+    Returns:
+        x, w (np.array): the nodes and weights, as given by histogram_gauss
+        psi (np.array): the orthonormal polynomials of degree 0..n-1 at the nodes, shape (n, n)
+    """
+    alpha, beta, a, b = histogram_recurrence(edges, density, n)
+    x, w = golub_welsch(alpha, beta)
+    psi = orthonormal_polynomials(alpha, beta, x)
+    x = a + (b-a)*(x+1)/2.
+    return x, w, psi
+
+
+def laurie(n, alpha, beta):
+    """Recurrence coefficients of the 2n+1 point Kronrod extension of the n point Gauss rule.
+
+    Laurie's algorithm, as in Gautschi's r_kronrod. alpha and beta need at least
+    floor(3n/2)+1 and ceil(3n/2)+1 coefficients.
+    """
+    a = np.zeros(2*n+1)
+    b = np.zeros(2*n+1)
+    k = np.arange(3*n//2 + 1)
+    a[k] = alpha[k]
+    k = np.arange((3*n+1)//2 + 1)
+    b[k] = beta[k]
+    s = np.zeros(n//2 + 2)
+    t = np.zeros(n//2 + 2)
+    t[1] = b[n+1]
+    for m in range(n-1):
+        k = np.arange((m+1)//2, -1, -1)
+        l = m - k
+        s[k+1] = np.cumsum((a[k+n+1] - a[l])*t[k+1] + b[k+n+1]*s[k] - b[l]*s[k+1])
+        s, t = t, s
+    j = np.arange(n//2, -1, -1)
+    s[j+1] = s[j]
+    for m in range(n-1, 2*n-2):
+        k = np.arange(m+1-n, (m-1)//2 + 1)
+        l = m - k
+        j = n - 1 - l
+        s[j+1] = np.cumsum(-(a[k+n+1] - a[l])*t[j+1] - b[k+n+1]*s[j+1] + b[l]*s[j+2])
+        j = j[-1]
+        k = (m+1)//2
+        if m % 2 == 0:
+            a[k+n+1] = a[k] + (s[j+1] - b[k+n+1]*s[j+2])/t[j+2]
+        else:
+            b[k+n+1] = s[j+1]/s[j+2]
+        s, t = t, s
+    a[2*n] = a[n-1] - b[2*n]*s[1]/t[1]
+    return a, b
+
+
+def kronrod(t, lam, n):
+    """2n+1 point Gauss-Kronrod rule of the discrete measure (t, lam).
+
+    n of its points are those of the n point Gauss rule.
+    """
+    t = np.asarray(t, dtype=float)
+    lo = np.min(t)
+    hi = np.max(t)
+    s = 2.0*(t-lo)/(hi-lo) - 1.0
+    alpha, beta = stieltjes(s, lam, (3*n+1)//2 + 1)
+    a, b = laurie(n, alpha, beta)
+    x, w = golub_welsch(a, b)
+    x = lo + (hi-lo)*(x+1)/2.
+    return x, w
+
+
+def clenshaw_curtis(t, lam, m, lo, hi):
+    """Clenshaw-Curtis rule with m+1 points on [lo, hi] for the discrete measure (t, lam).
+
+    The weights integrate the polynomials up to degree m exactly. The points for
+    m are also points for 2m. m = 0 gives the midpoint.
+    """
+    if m == 0:
+        return np.array([(lo+hi)/2.]), np.array([np.sum(lam)])
+    k = np.arange(m+1)
+    theta = np.pi*k/m
+    x = (lo+hi)/2. + (hi-lo)/2.*np.cos(theta)
+    # Chebyshev moments of the measure
+    u = np.clip(2.0*(np.asarray(t, dtype=float)-lo)/(hi-lo) - 1.0, -1.0, 1.0)
+    mu = np.cos(np.outer(k, np.arccos(u))).dot(lam)
+    w = np.linalg.solve(np.cos(np.outer(k, theta)), mu)
+    return x[::-1], w[::-1]
+
+
+def characteristic_coefficients(F, J):
+    """Fourier coefficients phi_j = E[exp(i j theta)], j = 0..J, of a distribution on the circle.
+
+    F is the cdf at equally spaced edges covering [0, 2 pi]. The density is
+    taken as constant within each cell, for which the integral is exact.
+    """
+    F = np.asarray(F, dtype=float)
+    cells = F.size - 1
+    h = 2*np.pi/cells
+    mid = (np.arange(cells) + 0.5)*h
+    j = np.arange(J+1)
+    # sinc(j h/2) is the exact average of exp(i j theta) over a cell
+    return np.exp(1j*np.outer(j, mid)).dot(np.diff(F)) * np.sinc(j*h/(2*np.pi))
+
+
+def fourier_weights(theta, phi):
+    """Weights of the n equally spaced angles theta that integrate their trigonometric interpolant.
+
+    phi are the coefficients of the distribution from characteristic_coefficients,
+    at least n//2 + 1 of them. The rule is exact for the trigonometric
+    polynomials of degree below n/2.
+    """
+    n = theta.size
+    J = n//2
+    factor = 2.0*np.ones(J+1)
+    factor[0] = 1.0
+    if n % 2 == 0:
+        factor[J] = 1.0  # The cosine at the Nyquist frequency only
+    j = np.arange(J+1)
+    return np.real(np.exp(-1j*np.outer(theta, j)).dot(factor*phi[:J+1]))/n
+
+
+def trigonometric_interpolant(theta, values, theta_eval):
+    """Evaluate at theta_eval the trigonometric interpolant of the values at the n equally spaced angles theta."""
+    n = theta.size
+    J = n//2
+    j = np.arange(J+1)
+    c = np.exp(-1j*np.outer(j, theta)).dot(values)/n
+    factor = 2.0*np.ones(J+1)
+    factor[0] = 1.0
+    if n % 2 == 0:
+        factor[J] = 1.0
+    return np.real(np.exp(1j*np.outer(theta_eval, j)).dot(factor*c))
@@ -4,11 +4,29 @@ import os
 import json
 import shutil
 import chaospy as cp
+from scipy.stats import norm
 from getSamplePoints import getSamplePoints
+from dakotaResults import readDakotaResults
+from dakotaInterface import makeComponentDirectory, getDakotaInput
+import quadrature
 
 
 class DakotaStatistics(ExternalCode):
-    """Use Dakota to estimate the statistics."""
+    """Use Dakota to estimate the statistics.
+
+    For quadrature the polynomial chaos expansion Dakota builds is computed in
+    process by default: the projection matrix is computed once from the
+    Dakota input file, and the coefficients are its product with the powers.
+    method_dict['dakota_statistics'] = 'dakota' calls Dakota instead, and
+    'validate' does both and prints the differences. Dakota runs in a
+    directory of the component inside the scratch directory of the run,
+    self.workdir, which also holds its approximated.dat.
+
+    The main and total Sobol indices of the uncertain variables are computed
+    from the coefficients of the quadrature expansion. For the other
+    coeff_method they are those of the Dakota results database, with
+    method_dict['dakota_hdf5'].
+    """
 
     def __init__(self, nDirections=10, method_dict=None):
         super(DakotaStatistics, self).__init__()
@@ -31,26 +49,85 @@ class DakotaStatistics(ExternalCode):
         self.add_output('mean', val=0.0, units='kWh', desc='mean annual energy output of wind farm')
         self.add_output('std', val=0.0, units='kWh', desc='std of energy output of wind farm')
 
-        # File in which the external code is implemented
-        pythonfile = 'getDakotaStatistics.py'
-        self.options['command'] = ['python', pythonfile, method_dict['dakota_filename']]
+        # The in process expansion, only the tensor product quadrature is implemented
+        self.statistics = method_dict.get('dakota_statistics', 'numpy')
+        if method_dict['coeff_method'] != 'quadrature':
+            self.statistics = 'dakota'
+        self.projection = None
+        if method_dict['coeff_method'] == 'quadrature':  # Also gives the derivatives when Dakota computes the statistics
+            self.projection, self.multi_index = dakota_projection(method_dict['dakota_histogram'])
+            assert self.projection.shape[1] == nDirections, 'The histogram bins do not match the number of directions'
+            self.norms = np.ones(self.projection.shape[0])  # The polynomials are orthonormal
+            nVariables = self.multi_index.shape[1]
+        else:
+            # No analytic derivatives of the sparse grid and regression expansions
+            self.deriv_options['type'] = 'fd'
+            self.multi_index = None
+            nVariables = 2 if method_dict['uncertain_var'] == 'direction_and_speed' else 1
+        # The expansion coefficients of the last solve, in the order of self.multi_index
+        self.coeff = None
+
+        self.add_output('sobol_main', val=np.zeros(nVariables), desc='main Sobol index of each uncertain variable')
+        self.add_output('sobol_total', val=np.zeros(nVariables), desc='total Sobol index of each uncertain variable')
+
+        # Dakota runs in a directory of the component, with a copy of the input files of the run
+        self.workdir = None
+        if self.statistics != 'numpy':
+            dakota_input = getDakotaInput(method_dict)
+            self.workdir = makeComponentDirectory(method_dict, 'statistics')
+            shutil.copy(dakota_input, self.workdir)
+            approx_input = os.path.join(os.path.dirname(dakota_input), 'approximate_at.dat')
+            if os.path.isfile(approx_input):
+                shutil.copy(approx_input, self.workdir)
+
+            # File in which the external code is implemented
+            pythonfile = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'getDakotaStatistics.py')
+            self.options['command'] = ['python', pythonfile,
+                                       os.path.join(self.workdir, os.path.basename(dakota_input))]
+            self.stderr = os.path.join(self.workdir, 'error.out')
 
     def solve_nonlinear(self, params, unknowns, resids):
 
-        # Generate the file with the power vector for Dakota
-        power = params['dirPowers']
-        np.savetxt('powerInput.txt', power, header='dirPowers')
-
-        # parent solve_nonlinear function actually runs the external code
-        super(DakotaStatistics, self).solve_nonlinear(params,unknowns,resids)
-
-        os.remove('powerInput.txt')
-
         # number of hours in a year
         hours = 8760.0
-        # promote statistics to class attribute
-        unknowns['mean'] = np.loadtxt('mean.txt')*hours
-        unknowns['std'] = np.loadtxt('std.txt')*hours
+        power = params['dirPowers']
+
+        if self.statistics != 'numpy':
+            # Generate the file with the power vector for Dakota
+            powerfile = os.path.join(self.workdir, 'powerInput.txt')
+            np.savetxt(powerfile, power, header='dirPowers')
+
+            # parent solve_nonlinear function actually runs the external code
+            super(DakotaStatistics, self).solve_nonlinear(params,unknowns,resids)
+
+            os.remove(powerfile)
+
+            # promote statistics to class attribute
+            unknowns['mean'] = np.loadtxt(os.path.join(self.workdir, 'mean.txt'))*hours
+            unknowns['std'] = np.loadtxt(os.path.join(self.workdir, 'std.txt'))*hours
+
+            if self.projection is None:
+                # The expansion of Dakota, and the Sobol indices with method_dict['dakota_hdf5']
+                results = readDakotaResults(self.workdir)
+                self.coeff = results['coeff']
+                self.multi_index = results['multi_index']
+                if results['sobol_main'] is not None:
+                    unknowns['sobol_main'] = results['sobol_main']
+                    unknowns['sobol_total'] = results['sobol_total']
+
+        if self.projection is not None:
+            self.coeff = self.projection.dot(power)
+            unknowns['sobol_main'], unknowns['sobol_total'] = sobol_indices(self.coeff, self.norms, self.multi_index)
+
+        if self.statistics != 'dakota':
+            mean = self.coeff[0]*hours
+            std = np.sqrt(np.sum(self.coeff[1:]**2))*hours
+            if self.statistics == 'validate':
+                print 'Relative difference to Dakota, mean = ', (mean - unknowns['mean'])/unknowns['mean'], \
+                    ' std = ', (std - unknowns['std'])/unknowns['std']
+            else:
+                unknowns['mean'] = mean
+                unknowns['std'] = std
 
         # Modify the statistics to account for the truncation of the weibull (speed) case.
         modify_statistics(params, unknowns)  # It doesn't do anything for the direction case.
@@ -59,14 +136,22 @@ class DakotaStatistics(ExternalCode):
 
     def linearize(self, params, unknowns, resids):
 
-        J = linearize_function(params)
+        J = projection_linearize(params, self.projection, self.norms)
+        J.update(sobol_linearize(params, self.projection, self.norms, self.multi_index))
         # print('Calculate Derivatives:', self.name)
 
         return J
 
 
 class ChaospyStatistics(Component):
-    """Use chaospy to estimate the statistics."""
+    """Use chaospy to estimate the statistics.
+
+    The quadrature, the orthogonal polynomials and the projection matrix are
+    computed once, each solve is a product of the projection with the powers.
+    method_dict['chaospy_statistics'] = 'fit' fits the expansion with chaospy
+    at every solve instead, as was done before. The main and total Sobol
+    indices of the uncertain variables are computed from the coefficients.
+    """
 
     def __init__(self, nDirections=10, method_dict=None):
         super(ChaospyStatistics, self).__init__()
@@ -89,9 +174,38 @@ class ChaospyStatistics(Component):
         self.add_output('mean', val=0.0, units='kWh', desc='mean annual energy output of wind farm')
         self.add_output('std', val=0.0, units='kWh', desc='std of energy output of wind farm')
 
+        # The projection also gives the derivatives with the fit
+        self.statistics = method_dict.get('chaospy_statistics', 'projection')
+        self.projection, self.norms, self.multi_index = chaospy_projection(method_dict['distribution'], nDirections)
+        nVariables = self.multi_index.shape[1]
+        self.add_output('sobol_main', val=np.zeros(nVariables), desc='main Sobol index of each uncertain variable')
+        self.add_output('sobol_total', val=np.zeros(nVariables), desc='total Sobol index of each uncertain variable')
 
     def solve_nonlinear(self, params, unknowns, resids):
 
+        power = params['dirPowers']
+        coeff = self.projection.dot(power)
+        unknowns['sobol_main'], unknowns['sobol_total'] = sobol_indices(coeff, self.norms, self.multi_index)
+        if self.statistics == 'projection':
+            mean = coeff[0]  # The first polynomial is the constant 1
+            std = np.sqrt(np.sum(coeff[1:]**2 * self.norms[1:]))
+        else:
+            mean, std = self.fit(params)
+
+        # number of hours in a year
+        hours = 8760.0
+        # promote statistics to class attribute
+        unknowns['mean'] = mean*hours
+        unknowns['std'] = std*hours
+
+        # Modify the statistics to account for the truncation of the weibull (speed) case.
+        modify_statistics(params, unknowns)  # It doesn't do anything for the direction case.
+
+        print 'In ChaospyStatistics'
+
+    def fit(self, params):
+        """Mean and std of the power from the expansion fitted by chaospy."""
+
         power = params['dirPowers']
         method_dict = params['method_dict']
         dist = method_dict['distribution']
@@ -118,21 +232,12 @@ class ChaospyStatistics(Component):
         # print std
         # print np.sqrt(np.sum(coeff[1:]**2 * cp.E(poly**2, dist)[1:]))
         # # std = np.sqrt(np.sum(coeff[1:]**2 * cp.E(poly**2, dist)[1:]))
-        # number of hours in a year
-        hours = 8760.0
-        # promote statistics to class attribute
-        unknowns['mean'] = mean*hours
-        unknowns['std'] = std*hours
-
-        # Modify the statistics to account for the truncation of the weibull (speed) case.
-        modify_statistics(params, unknowns)  # It doesn't do anything for the direction case.
-
-        print 'In ChaospyStatistics'
+        return mean, std
 
     def linearize(self, params, unknowns, resids):
 
-        # Todo update linearize
-        J = linearize_function(params)
+        J = projection_linearize(params, self.projection, self.norms)
+        J.update(sobol_linearize(params, self.projection, self.norms, self.multi_index))
         return J
 
 
@@ -168,23 +273,9 @@ class RectStatistics(Component):
 
     def solve_nonlinear(self, params, unknowns, resids):
 
-        power = params['dirPowers']
-        weights = params['windWeights']
-
-        mean = sum(power*weights)
-        # Calculate std to ensure it is positive, first method could have issues for small number of samples
-        # std = np.sqrt(sum(np.power(power, 2)*weights) - np.power(mean, 2))  # Revisar if this is right
-        var = np.sum(np.power(power - mean, 2) * weights)
-        std = np.sqrt(var)
-
-        # number of hours in a year
-        hours = 8760.0
-        # promote statistics to class attribute
-        unknowns['mean'] = mean*hours
-        unknowns['std'] = std*hours
-
-        # Modify the statistics to account for the truncation of the weibull (speed) case.
-        modify_statistics(params, unknowns)  # It doesn't do anything for the direction case.
+        mean, std = weighted_statistics(params['dirPowers'], params['windWeights'], params['method_dict'])
+        unknowns['mean'] = mean
+        unknowns['std'] = std
 
         print 'In RectStatistics'
         # This was added to make the optimization video.
@@ -222,31 +313,502 @@ class RectStatistics(Component):
         return J
 
 
+class BatchStatistics(Component):
+    """Estimate the statistics of several layouts at once, the powers of each layout are a row of a matrix.
+
+    The same estimates as RectStatistics, ChaospyStatistics and the in process
+    DakotaStatistics (only for quadrature), computed for all the rows in one
+    pass.
+    """
+
+    def __init__(self, nLayouts=1, nDirections=10, method_dict=None):
+        super(BatchStatistics, self).__init__()
+
+        # set finite difference options (fd used for testing only)
+        # self.deriv_options['force_fd'] = True
+        self.deriv_options['form'] = 'central'
+        self.deriv_options['step_size'] = 1.0e-5
+        self.deriv_options['step_calc'] = 'relative'
+
+        # define inputs
+        self.add_param('layoutPowers', np.zeros((nLayouts, nDirections)), units ='kW',
+                       desc='matrix containing the power production of each layout (rows) for each winddirection and windspeed pair (columns)')
+        self.add_param('method_dict', method_dict,
+                       desc='parameters for the UQ method')
+        self.add_param('windWeights', np.zeros(nDirections),
+                       desc='vector containing the integration weight associated with each power')
+
+        # define output
+        self.add_output('mean', val=np.zeros(nLayouts), units='kWh', desc='mean annual energy output of each layout')
+        self.add_output('std', val=np.zeros(nLayouts), units='kWh', desc='std of energy output of each layout')
+
+        # The statistics are weighted sums of the powers or a spectral projection
+        method = method_dict['method']
+        self.projection = None
+        if method == 'dakota':
+            if method_dict['coeff_method'] != 'quadrature':
+                raise ValueError('BatchStatistics needs the coeff_method "quadrature" for the dakota method.')
+            self.projection, self.multi_index = dakota_projection(method_dict['dakota_histogram'])
+            self.norms = np.ones(self.projection.shape[0])  # The polynomials are orthonormal
+        elif method == 'chaospy':
+            self.projection, self.norms, self.multi_index = chaospy_projection(method_dict['distribution'], nDirections)
+
+    def solve_nonlinear(self, params, unknowns, resids):
+
+        power = params['layoutPowers']
+        if self.projection is None:
+            weights = params['windWeights']
+            mean = power.dot(weights)
+            std = np.sqrt(((power - mean[:, None])**2).dot(weights))
+        else:
+            coeff = power.dot(self.projection.T)
+            mean = coeff[:, 0]
+            std = np.sqrt((coeff[:, 1:]**2).dot(self.norms[1:]))
+
+        # number of hours in a year
+        hours = 8760.0
+        statistics = {'mean': mean*hours, 'std': std*hours}
+
+        # Modify the statistics to account for the truncation of the weibull (speed) case.
+        modify_statistics(params, statistics)  # It doesn't do anything for the direction case.
+
+        unknowns['mean'] = statistics['mean']
+        unknowns['std'] = statistics['std']
+
+        print 'In BatchStatistics'
+
+    def linearize(self, params, unknowns, resids):
+
+        # Block diagonal, the statistics of each layout depend on its row of powers
+        nLayouts, nDirections = params['layoutPowers'].shape
+        J = {}
+        J[('mean', 'layoutPowers')] = np.zeros((nLayouts, nLayouts*nDirections))
+        J[('std', 'layoutPowers')] = np.zeros((nLayouts, nLayouts*nDirections))
+        for i, power in enumerate(params['layoutPowers']):
+            layout_params = {'dirPowers': power, 'windWeights': params['windWeights'],
+                             'method_dict': params['method_dict']}
+            if self.projection is None:
+                Ji = linearize_function(layout_params)
+            else:
+                Ji = projection_linearize(layout_params, self.projection, self.norms)
+            columns = slice(i*nDirections, (i+1)*nDirections)
+            J[('mean', 'layoutPowers')][i, columns] = Ji[('mean', 'dirPowers')][0]
+            J[('std', 'layoutPowers')][i, columns] = Ji[('std', 'dirPowers')][0]
+
+        return J
+
+
+class LayoutMUX(Component):
+    """Stack the power vectors of the layouts into the rows of the matrix of BatchStatistics."""
+
+    def __init__(self, nLayouts=1, nDirections=10):
+        super(LayoutMUX, self).__init__()
+
+        self.nLayouts = nLayouts
+        self.nDirections = nDirections
+        for i in range(nLayouts):
+            self.add_param('dirPowers%i' % i, np.zeros(nDirections), units='kW',
+                           desc='vector containing the power production of layout %i for each winddirection and windspeed pair' % i)
+        self.add_output('layoutPowers', np.zeros((nLayouts, nDirections)), units='kW',
+                        desc='matrix containing the power production of each layout (rows)')
+
+    def solve_nonlinear(self, params, unknowns, resids):
+
+        unknowns['layoutPowers'] = np.array([params['dirPowers%i' % i] for i in range(self.nLayouts)])
+
+    def linearize(self, params, unknowns, resids):
+
+        n = self.nDirections
+        J = {}
+        for i in range(self.nLayouts):
+            J[('layoutPowers', 'dirPowers%i' % i)] = np.zeros((self.nLayouts*n, n))
+            J[('layoutPowers', 'dirPowers%i' % i)][i*n:(i+1)*n] = np.eye(n)
+
+        return J
+
+
+class RobustObjective(Component):
+    """The objective of the optimization, minus the robust AEP of objective_std_factor or weighted_tail.
+
+    The 'quantile' and 'cvar' objectives come from the weighted samples of the
+    powers, dirPowers and windWeights, the others are mean - c*std from the
+    statistics components.
+    """
+
+    def __init__(self, method_dict=None, nDirections=1):
+        super(RobustObjective, self).__init__()
+
+        self.method_dict = method_dict
+        self.objective = method_dict.get('objective', 'mean')
+        if self.objective in ['quantile', 'cvar']:
+            self.alpha = 1 - objective_level(method_dict)
+            self.add_param('dirPowers', np.zeros(nDirections), units='kW',
+                           desc='vector containing the power production at each wind direction and speed')
+            self.add_param('windWeights', np.zeros(nDirections),
+                           desc='vector containing the integration weight associated with each power')
+        else:
+            self.c = objective_std_factor(method_dict)
+            self.add_param('mean', val=0.0, desc='mean annual energy output of wind farm')
+            self.add_param('std', val=0.0, desc='std of energy output of wind farm')
+        self.add_output('obj', val=0.0, desc='objective, minus the robust AEP')
+
+    def solve_nonlinear(self, params, unknowns, resids):
+
+        if self.objective in ['quantile', 'cvar']:
+            tail = self.tail(params)
+            unknowns['obj'] = -tail[self.objective]
+        else:
+            unknowns['obj'] = -1.*(params['mean'] - self.c*params['std'])
+
+    def linearize(self, params, unknowns, resids):
+
+        J = {}
+        if self.objective in ['quantile', 'cvar']:
+            tail = self.tail(params)
+            J[('obj', 'dirPowers')] = -np.array([tail['d%s_dpower' % self.objective]])
+            J[('obj', 'windWeights')] = -np.array([tail['d%s_dweights' % self.objective]])
+        else:
+            J[('obj', 'mean')] = np.array([[-1.0]])
+            J[('obj', 'std')] = np.array([[self.c]])
+        return J
+
+    def tail(self, params):
+        """The quantile and cvar in kWh, and their gradients, of the weighted powers.
+
+        The probability k truncated from the speed distribution is added as a
+        sample of zero power, the speeds outside the truncation don't produce
+        power, as in modify_statistics for the mean.
+        """
+
+        # number of hours in a year
+        hours = 8760.0
+        power = params['dirPowers']
+        weights = params['windWeights']
+        if np.any(weights < 0):
+            raise ValueError('The %s objective needs nonnegative windWeights, a quadrature with negative weights '
+                             'is not the distribution of the samples.' % self.objective)
+        total = np.sum(weights)
+        k = truncation_value(self.method_dict)
+        tail = weighted_tail(np.concatenate([[0.0], power]),
+                             np.concatenate([[k], (1-k)*weights/total]), self.alpha)
+        derivatives = {}
+        for name in ['quantile', 'cvar']:
+            derivatives[name] = tail[name]*hours
+            derivatives['d%s_dpower' % name] = tail['d%s_dpower' % name][1:]*hours
+            # Through the normalization of the weights
+            dweights = (1-k)*tail['d%s_dweights' % name][1:]
+            derivatives['d%s_dweights' % name] = (dweights - np.sum(dweights*weights/total))/total*hours
+        return derivatives
+
+
+def weighted_tail(power, weights, alpha):
+    """The lower alpha quantile and the conditional value at risk of weighted samples, and their (sub)gradients.
+
+    The quantile is the inverse of the weighted empirical cdf at alpha, the
+    sample where the cumulative weight, in increasing order of the powers,
+    reaches alpha. The conditional value at risk is the mean of the lower
+    alpha tail, with the part of the weight of the quantile sample that
+    completes alpha. The weights are normalized.
+
+    Args:
+        power (np.array): the samples
+        weights (np.array): their nonnegative weights
+        alpha (float): the probability of the lower tail, 0.1 for the P90
+
+    Returns:
+        dict: quantile, cvar, and their gradients dquantile_dpower,
+            dquantile_dweights, dcvar_dpower and dcvar_dweights. Where the
+            order of the samples changes they are subgradients, the one of the
+            quantile sample.
+    """
+
+    power = np.asarray(power, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    total = np.sum(weights)
+    w = weights/total
+    order = np.argsort(power, kind='mergesort')
+    cumulative = np.cumsum(w[order])
+    # The first sample where the cumulative weight reaches alpha
+    q = min(np.searchsorted(cumulative, alpha), power.size-1)
+    below = order[:q]
+    iq = order[q]
+    previous = cumulative[q-1] if q > 0 else 0.0
+
+    quantile = power[iq]
+    cvar = (np.sum(w[below]*power[below]) + (alpha - previous)*quantile)/alpha
+
+    dquantile_dpower = np.zeros(power.size)
+    dquantile_dpower[iq] = 1.0
+    dcvar_dpower = np.zeros(power.size)
+    dcvar_dpower[below] = w[below]/alpha
+    dcvar_dpower[iq] += (alpha - previous)/alpha
+    # The derivative for the normalized weights, then through the normalization
+    dcvar_dw = np.zeros(power.size)
+    dcvar_dw[below] = (power[below] - quantile)/alpha
+    dcvar_dweights = (dcvar_dw - np.sum(dcvar_dw*w))/total
+
+    return {'quantile': quantile, 'cvar': cvar,
+            'dquantile_dpower': dquantile_dpower, 'dquantile_dweights': np.zeros(power.size),
+            'dcvar_dpower': dcvar_dpower, 'dcvar_dweights': dcvar_dweights}
+
+
+def objective_level(method_dict):
+    """The probability method_dict['objective_level'] of the quantile and cvar objectives, default 0.9 (the P90)."""
+
+    level = method_dict.get('objective_level', 0.9)
+    if not 0 < level < 1:
+        raise ValueError('objective_level must be between 0 and 1, not %s.' % level)
+    return level
+
+
+def weighted_statistics(power, weights, method_dict):
+    """Mean and std of the energy from the powers and the integration weights (used by RectStatistics)."""
+
+    mean = sum(power*weights)
+    # Calculate std to ensure it is positive, first method could have issues for small number of samples
+    # std = np.sqrt(sum(np.power(power, 2)*weights) - np.power(mean, 2))  # Revisar if this is right
+    var = np.sum(np.power(power - mean, 2) * weights)
+    std = np.sqrt(var)
+
+    # number of hours in a year
+    hours = 8760.0
+    statistics = {'mean': mean*hours, 'std': std*hours}
+
+    # Modify the statistics to account for the truncation of the weibull (speed) case.
+    modify_statistics({'method_dict': method_dict}, statistics)  # It doesn't do anything for the direction case.
+
+    return statistics['mean'], statistics['std']
+
+
+def rqmc_standard_error(power, weights, replicates, method_dict):
+    """Standard errors of the mean and std from the spread of the randomized QMC replicates.
+
+    The points of each replicate are consecutive, as given by windfarm_setup.getPointsQMC.
+    """
+
+    means = []
+    stds = []
+    for p, w in zip(np.split(np.asarray(power), replicates), np.split(np.asarray(weights), replicates)):
+        mean, std = weighted_statistics(p, w/np.sum(w), method_dict)
+        means.append(mean)
+        stds.append(std)
+
+    return np.std(means, ddof=1)/np.sqrt(replicates), np.std(stds, ddof=1)/np.sqrt(replicates)
+
+
+def dakota_projection(histogram):
+    """Matrix from the powers to the coefficients of the Dakota quadrature polynomial chaos expansion of histogram bins.
+
+    The histogram bin variables get their orthonormal polynomials up to degree
+    n-1 of quadrature_order n, for all the variables the tensor products. The
+    coefficients are the projections of the powers on the polynomials,
+    evaluated at the sample points with the weights that the points backend
+    returned (Dakota's own by default), so that they are those of Dakota. The
+    first one is the mean and the sum of the squares of the others is the variance.
+
+    Args:
+        histogram (dict): The histogram bin variables, method_dict['dakota_histogram'] from getSamplePoints.getHistogramBins,
+            with the 'points' and 'weights' of the quadrature set by windfarm_setup.getDakotaPoints
+
+    Returns:
+        projection (np.array): shape (terms, points), the points in the order of the dakota tabular file
+        multi_index (np.array): the degree in each variable of the polynomials, shape (terms, variables)
+    """
+
+    n = histogram['quadrature_order']
+    abscissas = histogram['abscissas']
+    ordinates = histogram['ordinates']
+    points = histogram['points']
+    weights = histogram['weights']
+    nvar, N = points.shape
+
+    # Tensor product, the degree of the first variable varies the fastest
+    psi = np.ones((N, 1))
+    for i in range(nvar):
+        psi_i = quadrature.histogram_polynomials(abscissas[i], ordinates[i], n, points[i])
+        psi = (psi_i[:, :, None]*psi[:, None, :]).reshape(N, -1)
+    grids = np.meshgrid(*[np.arange(n)]*nvar, indexing='ij')
+    multi_index = np.column_stack([grid.flatten() for grid in grids[::-1]])
+
+    projection = (psi*weights[:, None]).T
+    return projection, multi_index
+
+
+def chaospy_projection(dist, n):
+    """Matrix from the powers to the coefficients of the n point Gauss expansion of chaospy, and the norms.
+
+    The same quadrature and polynomials as ChaospyStatistics.fit. The norms
+    of the polynomials are integrated with the quadrature, which is exact for
+    them, like cp.Std does.
+
+    Returns:
+        projection (np.array): shape (terms, points)
+        norms (np.array): the expected values of the squared polynomials
+        multi_index (np.array): the degree in each variable of the polynomials, shape (terms, variables)
+    """
+
+    points, weights = cp.generate_quadrature(order=n-1, domain=dist, rule='G')
+    poly = cp.orth_ttr(n-1, dist)
+    psi = poly(*points)  # shape (terms, points)
+    norms = np.sum(psi**2 * weights, axis=1)
+    projection = psi*weights/norms[:, None]
+    multi_index = np.array([np.max(poly[k].keys, axis=0) for k in range(len(poly))], ndmin=2)
+    return projection, norms, multi_index
+
+
+def sobol_indices(coeff, norms, multi_index):
+    """Main and total Sobol indices of each variable from the coefficients of a polynomial chaos expansion.
+
+    The variance of each term is its squared coefficient times the norm of its
+    polynomial. The main index of a variable adds up the terms of only that
+    variable, the total index all the terms that include it.
+
+    Returns:
+        sobol_main, sobol_total (np.array): shape (variables,), zero for a constant expansion
+    """
+
+    active = multi_index > 0  # The variables of each term
+    only = active & (np.sum(active, axis=1) == 1)[:, None]
+    variance = coeff**2 * norms
+    var = np.sum(variance[np.any(active, axis=1)])
+    if var == 0.0:
+        return np.zeros(active.shape[1]), np.zeros(active.shape[1])
+    return variance.dot(only)/var, variance.dot(active)/var
+
+
+def sobol_linearize(params, projection, norms, multi_index):
+    """Derivatives of the Sobol indices of sobol_indices with respect to the powers."""
+
+    coeff = projection.dot(params['dirPowers'])
+    active = multi_index > 0
+    only = active & (np.sum(active, axis=1) == 1)[:, None]
+    variance = coeff**2 * norms
+    dvariance_dpower = 2*(coeff*norms)[:, None]*projection  # shape (terms, points)
+    terms = np.any(active, axis=1)
+    var = np.sum(variance[terms])
+    dvar_dpower = np.sum(dvariance_dpower[terms], axis=0)
+
+    J = {}
+    for output, include in [('sobol_main', only), ('sobol_total', active)]:
+        if var == 0.0:
+            J[(output, 'dirPowers')] = np.zeros((active.shape[1], projection.shape[1]))
+        else:
+            sobol = variance.dot(include)/var
+            J[(output, 'dirPowers')] = (include.T.dot(dvariance_dpower) - sobol[:, None]*dvar_dpower)/var
+
+    return J
+
+
 def linearize_function(params):
+    """Derivatives of the mean and std of weighted_statistics with respect to the powers."""
 
+    power = params['dirPowers']
     weights = params['windWeights']
 
+    mean = np.sum(power*weights)
+    deviation = power - mean
+    std = np.sqrt(np.sum(deviation**2 * weights))
+    dmean_dpower = weights
+    # The mean in the deviations also depends on the powers, it cancels if the weights add up to one
+    dvar_dpower = 2*weights*deviation - 2*weights*np.sum(weights*deviation)
+
+    return statistics_jacobian(params, mean, std, dmean_dpower, dvar_dpower)
+
+
+def projection_linearize(params, projection, norms):
+    """Derivatives of the mean and std of a spectral projection with respect to the powers.
+
+    The coefficients are projection.dot(power), the mean the first one and
+    the variance the sum of the squares of the others times the norms of
+    their polynomials.
+    """
+
+    coeff = projection.dot(params['dirPowers'])
+    mean = coeff[0]
+    std = np.sqrt(np.sum(coeff[1:]**2 * norms[1:]))
+    dmean_dpower = projection[0]
+    dvar_dpower = 2*(coeff[1:]*norms[1:]).dot(projection[1:])
+
+    return statistics_jacobian(params, mean, std, dmean_dpower, dvar_dpower)
+
+
+def statistics_jacobian(params, mean, std, dmean_dpower, dvar_dpower):
+    """Jacobian of the annual mean and std from the derivatives of the mean and variance of the power.
+
+    Includes the truncation of modify_statistics for the speed cases.
+    """
+
     # number of hours in a year
     hours = 8760.0
-    dmean_dpower = weights*hours
+    dmean_dpower = dmean_dpower*hours
+    if std > 0.0:
+        dstd_dpower = dvar_dpower/(2*std)*hours
+    else:
+        dstd_dpower = np.zeros(len(dmean_dpower))  # Constant power, the std is not differentiable
+
+    # The chain rule of modify_statistics
+    k = truncation_value(params['method_dict'])
+    if k > 0.0:
+        dstd_dpower = np.sqrt(1-k)*dstd_dpower + np.sqrt(k*(1-k))*dmean_dpower
+        dmean_dpower = (1-k)*dmean_dpower
 
     J = {}
     J[('mean', 'dirPowers')] = np.array([dmean_dpower])
+    J[('std', 'dirPowers')] = np.array([dstd_dpower])
 
     return J
 
 
+def objective_std_factor(method_dict):
+    """The factor c of the std in the objective of the optimization, mean - c*std.
+
+    method_dict['objective'] is
+        'mean': the mean AEP, c = 0 (default)
+        'mean_std': mean - k*std, k = method_dict['objective_k'] (default 1)
+        'normal_quantile': the AEP exceeded with probability method_dict['objective_level'] (default 0.9, the P90)
+        'normal_cvar': the mean AEP of the worst 1 - method_dict['objective_level'] of the outcomes
+        'quantile' and 'cvar': as normal_quantile and normal_cvar for the
+            distribution of the weighted samples, see RobustObjective, they
+            have no factor c
+    The normal_ objectives are those of a normally distributed AEP with the mean
+    and std of the statistics components, so they are mean_std with a given k.
+    """
+
+    objective = method_dict.get('objective', 'mean')
+    if objective == 'mean':
+        return 0.0
+    elif objective == 'mean_std':
+        return method_dict.get('objective_k', 1.0)
+    elif objective == 'normal_quantile':
+        return norm.ppf(objective_level(method_dict))
+    elif objective == 'normal_cvar':
+        level = objective_level(method_dict)
+        return norm.pdf(norm.ppf(level))/(1-level)
+    elif objective in ['quantile', 'cvar']:
+        raise ValueError('the %s objective is not mean - c*std, it comes from the weighted samples.' % objective)
+    else:
+        raise ValueError('unknown objective option "%s", valid options "mean", "mean_std", "normal_quantile", '
+                         '"normal_cvar", "quantile" or "cvar".' % objective)
+
+
+def truncation_value(method_dict):
+    """How much of the probability was truncated from the speed distribution, 0 for the direction case."""
+
+    uncertain_var = method_dict['uncertain_var']
+    if uncertain_var == 'direction':
+        return 0.0
+    dist = method_dict['distribution']
+    if uncertain_var == 'direction_and_speed':
+        dist = dist[1]
+    return dist.get_truncation_value()
+
+
 def modify_statistics(params, unknowns):
     uncertain_var = params['method_dict']['uncertain_var']
     if uncertain_var == 'direction':
         pass
     else:  # either the speed or the speed and direction case
-        dist = params['method_dict']['distribution']
-        if uncertain_var == 'speed':
-            k = dist.get_truncation_value()  # how much of the probability was truncated
-        if uncertain_var == 'direction_and_speed':
-            dist = dist[1]
-            k = dist.get_truncation_value()  # how much of the probability was truncated
+        k = truncation_value(params['method_dict'])  # how much of the probability was truncated
         meant = unknowns['mean']  # the truncated mean
         stdt = unknowns['std']  # the truncated std
         unknowns['mean'] = (1-k) * meant  # weighted by how much of probability is between 0 and 30 or a and b
@@ -1,4 +1,5 @@
 
+import os
 import numpy as np
 # import matplotlib.pyplot as plt
 import json
@@ -9,6 +10,8 @@ from AEPGroups import AEPGroup
 import distributions
 import windfarm_setup
 import approximate
+from dakotaInterface import getWorkDirectory
+from statisticsComponents import weighted_statistics, rqmc_standard_error
 
 from wakeexchange.floris import floris_wrapper, add_floris_params_IndepVarComps
 from wakeexchange.jensen import jensen_wrapper, add_jensen_params_IndepVarComps
@@ -19,13 +22,31 @@ def run(method_dict, n):
     """
     method_dict = {}
     keys of method_dict:
-        'method' = 'dakota', 'rect' or 'chaospy'  # 'chaospy needs updating
+        'method' = 'dakota', 'rect', 'nested', 'periodic', 'qmc', 'adaptive' or 'chaospy'  # 'chaospy needs updating
         'wake_model = 'floris', 'jensen', 'gauss', 'larsen' # larsen is not working
         'coeff_method' = 'quadrature', 'sparse_grid' or 'regression'
+                         for rect direction_and_speed 'sparse_grid' uses a Smolyak grid of level n
         'uncertain_var' = 'speed', 'direction' or 'direction_and_speed'
         'layout' = 'amalia', 'optimized', 'grid', 'random', 'test'
         'distribution' = a distribution object
+        'windrose' = wind rose file for the direction distribution, None for the smoothed amalia
+        'speed_rule' = 'gauss' or 'rect', speeds for the direction conditional weibull (default 'gauss')
         'dakota_filename' = 'dakotaInput.in', applicable for dakota method
+        'nested_rule' = 'clenshaw_curtis', 'kronrod' or 'dyadic', for the nested method n is the level
+        'kronrod_points' = number of Gauss points extended by the kronrod nested rule (default 5)
+        'periodic_weights' = 'pdf' or 'importance', direction points of the periodic method (default 'pdf')
+        'qmc_sequence' = 'sobol' or 'halton', for the qmc method n is the number of points per replicate
+        'qmc_replicates' = number of independently scrambled replicates, for the standard error (default 4)
+        'qmc_seed' = seed of the scrambling (default 0)
+        'adaptive_tol' = relative tolerance of the adaptive method, n is the initial number of directions (default 1e-3)
+        'adaptive_max' = maximum number of directions of the adaptive method (default 100)
+        'points_cache' = True or False, read the points from the points cache (default False)
+        'points_backend' = 'dakota' or 'numpy', who computes the quadrature points for the dakota method (default 'dakota'),
+            the numpy points differ from the Dakota ones by up to 1e-4 relative, see windfarm_setup.getDakotaPoints
+        'dakota_batch' = True or False, dakota evaluates all the samples in one call of the analysis driver (default False)
+        'dakota_hdf5' = True or False, read the dakota statistics and Sobol indices from its results database (default False)
+        'dakota_statistics' = 'numpy', 'dakota' or 'validate', who computes the statistics of the dakota quadrature (default 'numpy')
+        'chaospy_statistics' = 'projection' or 'fit', precomputed projection on the chaospy polynomials or the chaospy fit at every solve (default 'projection')
         'offset' = [0, 1, 2, Noffset-1]
         'Noffset' = 'number of starting directions to consider'
 
@@ -35,7 +56,11 @@ def run(method_dict, n):
 
     ### For visualization purposes. Set up the file that specifies the points for the polynomial approximation ###
     if method_dict['method'] == 'dakota':
-        approximate.generate_approx_file(method_dict['uncertain_var'])
+        approxfile = os.path.join(getWorkDirectory(method_dict), 'approximate_at.dat')
+        approximate.generate_approx_file(method_dict['uncertain_var'], approxfile)
+
+    if method_dict['method'] == 'adaptive':
+        return run_adaptive(method_dict, n)
 
     ### Set up the wind speeds and wind directions for the problem ###
 
@@ -50,6 +75,45 @@ def run(method_dict, n):
     for i in range(N):
         print i+1, '\t', '%.2f' % windspeeds[i], '\t', '%.2f' % winddirections[i]
 
+    prob = solve_problem(method_dict, winddirections, windspeeds, weights)
+
+    # For visualization purposes. Get the PC approximation
+    if method_dict['method'] == 'dakota' and prob.root.AEPcomp.workdir is not None:
+        # Dakota wrote the approximation in the directory of the statistics component
+        approxfile = os.path.join(prob.root.AEPcomp.workdir, 'approximated.dat')
+        winddirections_approx, windspeeds_approx, power_approx = approximate.get_approximation(method_dict, approxfile)
+    elif method_dict['method'] == 'periodic' and method_dict['uncertain_var'] == 'direction' \
+            and method_dict.get('periodic_weights', 'pdf') == 'pdf':
+        # The Fourier series approximation
+        winddirections_approx, windspeeds_approx, power_approx = \
+            approximate.get_fourier_approximation(method_dict, winddirections, prob['dirPowers'])
+    else:
+        winddirections_approx = np.array([None])
+        windspeeds_approx = np.array([None])
+        power_approx = np.array([None])
+
+    # print the results
+    mean_data = prob['mean']
+    std_data = prob['std']
+    factor = 1e6
+    print 'mean = ', mean_data/factor, ' GWhrs'
+    print 'std = ', std_data/factor, ' GWhrs'
+    if method_dict['method'] == 'qmc':
+        mean_se, std_se = rqmc_standard_error(prob['dirPowers'], weights,
+                                              method_dict.get('qmc_replicates', 4), method_dict)
+        print 'standard error of the mean = ', mean_se/factor, ' GWhrs'
+        print 'standard error of the std = ', std_se/factor, ' GWhrs'
+    power = prob['dirPowers']
+
+    return mean_data/factor, std_data/factor, N, winddirections, windspeeds, power,\
+           winddirections_approx, windspeeds_approx, power_approx
+
+
+def solve_problem(method_dict, winddirections, windspeeds, weights):
+    """Set up and run the AEP problem for the given points and weights."""
+
+    N = winddirections.size
+
     # Turbines layout
     turbineX, turbineY = windfarm_setup.getLayout(method_dict['layout'])
 
@@ -117,24 +181,125 @@ def run(method_dict, n):
     prob.pre_run_check()
     prob.run()
 
-    # For visualization purposes. Get the PC approximation
-    if method_dict['method'] == 'dakota':
-        winddirections_approx, windspeeds_approx, power_approx = approximate.get_approximation(method_dict)
-    else:
-        winddirections_approx = np.array([None])
-        windspeeds_approx = np.array([None])
-        power_approx = np.array([None])
+    return prob
 
-    # print the results
-    mean_data = prob['mean']
-    std_data = prob['std']
+
+def run_adaptive(method_dict, n):
+    """Run the adaptive method, starting from n direction bins.
+
+    The power is computed once for each direction, the refinement only evaluates
+    the new directions. See windfarm_setup.getPointsAdaptive.
+    """
+
+    evaluated = {}
+
+    def power_function(winddirections):
+        new = np.array([x for x in winddirections if x not in evaluated])
+        if new.size:
+            windspeeds = np.ones(new.size)*method_dict['windspeed_ref']
+            prob = solve_problem(method_dict, new, windspeeds, np.ones(new.size)/new.size)
+            evaluated.update(zip(new, prob['dirPowers']))
+        return np.array([evaluated[x] for x in winddirections])
+
+    winddirections, weights, power = windfarm_setup.getPointsAdaptive(method_dict['distribution'], method_dict,
+                                                                      n, power_function)
+    windspeeds = np.ones(winddirections.size)*method_dict['windspeed_ref']
+    N = winddirections.size
+
+    print 'Locations at which power is evaluated'
+    print '\twindspeed \t winddirection'
+    for i in range(N):
+        print i+1, '\t', '%.2f' % windspeeds[i], '\t', '%.2f' % winddirections[i]
+    print 'Number of power evaluations = ', len(evaluated)
+
+    mean_data, std_data = weighted_statistics(power, weights, method_dict)
     factor = 1e6
     print 'mean = ', mean_data/factor, ' GWhrs'
     print 'std = ', std_data/factor, ' GWhrs'
-    power = prob['dirPowers']
 
     return mean_data/factor, std_data/factor, N, winddirections, windspeeds, power,\
-           winddirections_approx, windspeeds_approx, power_approx
+           np.array([None]), np.array([None]), np.array([None])
+
+
+def sweep(method_dict, levels):
+    """Run the levels of a nested rule, computing the power only at the points of the finest level.
+
+    The points of the coarser levels are among those of the finest one, their
+    statistics are computed from the powers already evaluated.
+
+    Returns:
+        A list with the return values of run for each level
+    """
+
+    results = run(method_dict, levels[-1])
+    mean_data, std_data, N, winddirections, windspeeds, power = results[:6]
+    no_approx = (np.array([None]), np.array([None]), np.array([None]))
+
+    sweep_results = []
+    for n in levels[:-1]:
+        points = windfarm_setup.getPoints(method_dict, n)
+        # Find the points in the finest level
+        distance = np.abs(points['winddirections'][:, None] - winddirections[None, :]) + \
+                   np.abs(points['windspeeds'][:, None] - windspeeds[None, :])
+        index = np.argmin(distance, axis=1)
+        if np.max(distance[np.arange(index.size), index]) > 1e-6:
+            raise ValueError('The points of level %s are not in the finest level, is the rule nested?' % n)
+        mean, std = weighted_statistics(power[index], points['weights'], method_dict)
+        factor = 1e6
+        sweep_results.append((mean/factor, std/factor, index.size, points['winddirections'],
+                              points['windspeeds'], power[index]) + no_approx)
+    sweep_results.append(results)
+
+    return sweep_results
+
+
+def run_offsets(method_dict, n):
+    """Run all the offsets 0..Noffset-1 at once, evaluating the power in a single problem.
+
+    The points of all the offsets are merged, the coinciding ones are computed
+    once, and the statistics of each offset are weighted sums of the shared
+    powers. Only for the methods whose statistics are weighted sums.
+
+    Returns:
+        A list with the return values of run for each offset
+    """
+
+    if method_dict['method'] not in ['rect', 'nested', 'periodic', 'qmc']:
+        raise ValueError('The offsets batch is only implemented for the weighted sum methods, not "%s".'
+                         % method_dict['method'])
+
+    offset_points = []
+    for offset in range(method_dict['Noffset']):
+        offset_dict = dict(method_dict)
+        offset_dict['offset'] = offset
+        offset_points.append(windfarm_setup.getPoints(offset_dict, n))
+
+    # The union of the points, without repetitions
+    winddirections = np.concatenate([points['winddirections'] for points in offset_points])
+    windspeeds = np.concatenate([points['windspeeds'] for points in offset_points])
+    unique_points = np.round(np.column_stack([winddirections, windspeeds]), 8)
+    unused, index, inverse = np.unique(unique_points, axis=0, return_index=True, return_inverse=True)
+    inverse = inverse.flatten()
+    N = index.size
+    print 'Number of points of all the offsets = ', winddirections.size, ', without repetitions = ', N
+
+    prob = solve_problem(method_dict, winddirections[index], windspeeds[index], np.ones(N)/N)
+    power = prob['dirPowers']
+
+    no_approx = (np.array([None]), np.array([None]), np.array([None]))
+    offset_results = []
+    start = 0
+    factor = 1e6
+    for offset, points in enumerate(offset_points):
+        stop = start + points['winddirections'].size
+        offset_power = power[inverse[start:stop]]
+        start = stop
+        mean, std = weighted_statistics(offset_power, points['weights'], method_dict)
+        print 'offset = ', offset, ' mean = ', mean/factor, ' GWhrs, std = ', std/factor, ' GWhrs'
+        offset_results.append((mean/factor, std/factor, offset_power.size, points['winddirections'],
+                               points['windspeeds'], offset_power) + no_approx)
+
+    return offset_results
 
 
 def plot():
@@ -167,6 +332,15 @@ def get_args():
     parser.add_argument('-l', '--layout', default='optimized', help="specify layout ['amalia', 'optimized', 'grid', 'random', 'test']")
     parser.add_argument('--offset', default=0, type=int, help='offset for starting direction. offset=[0, 1, 2, Noffset-1]')
     parser.add_argument('--Noffset', default=10, type=int, help='number of starting directions to consider')
+    parser.add_argument('--offsets_batch', action='store_true', help='Run all the Noffset offsets in a single problem, the power of the coinciding points is computed once')
+    parser.add_argument('--windrose', default=None, help='wind rose file in the WindRoses format, e.g. ../WindRoses/windrose_lissett_single_average_speed.txt. Defaults to the smoothed amalia wind rose')
+    parser.add_argument('--nested_rule', default='clenshaw_curtis', choices=['clenshaw_curtis', 'kronrod', 'dyadic'], help='rule for the nested method')
+    parser.add_argument('--conditional', action='store_true', help='For direction_and_speed, the weibull scale depends on the direction through the directionally averaged speeds')
+    parser.add_argument('--points_backend', default='dakota', choices=['dakota', 'numpy'], help='For the dakota method, compute the quadrature points in numpy instead of calling dakota, they differ from the dakota points by up to 1e-4 relative')
+    parser.add_argument('--dakota_batch', action='store_true', help='Dakota passes all the samples to one call of the analysis driver (needs Dakota 6.11 or later)')
+    parser.add_argument('--dakota_hdf5', action='store_true', help='Dakota writes the statistics and the Sobol indices to a results database (needs Dakota built with HDF5 and h5py)')
+    parser.add_argument('--dakota_statistics', default='numpy', choices=['numpy', 'dakota', 'validate'], help='For the dakota method with quadrature, compute the expansion in process, call dakota, or do both and print the differences')
+    parser.add_argument('--points_cache', action='store_true', help='Read the points from the points cache, and save them there when they are not in it')
     parser.add_argument('--verbose', action='store_true', help='Includes results for every run in the output json file')
     parser.add_argument('--version', action='version', version='Statistics convergence 0.0')
     args = parser.parse_args()
@@ -198,10 +372,16 @@ if __name__ == "__main__":
         dist = distributions.getWeibull()
         method_dict['distribution'] = dist
     elif method_dict['uncertain_var'] == 'direction':
-        dist = distributions.getWindRose()
+        dist = distributions.getWindRose(method_dict['windrose'])
+        method_dict['distribution'] = dist
+    elif method_dict['uncertain_var'] == 'direction_and_speed' and method_dict['conditional']:
+        if method_dict['windrose'] is None:
+            dist = distributions.getJointWindRoseWeibull()
+        else:
+            dist = distributions.getJointWindRoseWeibull(method_dict['windrose'])
         method_dict['distribution'] = dist
     elif method_dict['uncertain_var'] == 'direction_and_speed':
-        dist1 = distributions.getWindRose()
+        dist1 = distributions.getWindRose(method_dict['windrose'])
         dist2 = distributions.getWeibull()
         dist = cp.J(dist1, dist2)
         method_dict['distribution'] = dist
@@ -220,12 +400,41 @@ if __name__ == "__main__":
 
     # Depending on the case n can represent number of quadrature points, sparse grid level, expansion order
     # n is roughly a surrogate for the number of samples
-    for n in range(5, 6, 1):
+    levels = range(5, 6, 1)
+    if method_dict['method'] == 'nested' and not method_dict['offsets_batch']:
+        # The power is only evaluated once, at the points of the finest level
+        # (the offsets batch evaluates its own points, see run_offsets)
+        sweep_results = sweep(method_dict, levels)
+    for i, n in enumerate(levels):
+
+        if method_dict['offsets_batch']:
+            # The statistics of every offset, from a single evaluation of the power
+            offset_results = run_offsets(method_dict, n)
+            mean.append([results[0] for results in offset_results])
+            std.append([results[1] for results in offset_results])
+            samples.append([results[2] for results in offset_results])
+            obj = {'mean': mean, 'std': std, 'samples': samples,
+                   'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
+                   'layout': method_dict['layout'], 'wake_model': method_dict['wake_model'],
+                   'Noffset': method_dict['Noffset'], 'offset': range(method_dict['Noffset'])}
+            if verbose:
+                winddir.append([results[3].tolist() for results in offset_results])
+                windspeed.append([results[4].tolist() for results in offset_results])
+                power.append([results[5].tolist() for results in offset_results])
+                obj.update({'winddirections': winddir, 'windspeeds': windspeed, 'power': power})
+            jsonfile = open('record.json', 'w')
+            json.dump(obj, jsonfile, indent=2)
+            jsonfile.close()
+            continue
 
         # Run the problem
+        if method_dict['method'] == 'nested':
+            results = sweep_results[i]
+        else:
+            results = run(method_dict, n)
         mean_data, std_data, N, winddirections, windspeeds, powers, \
         winddirections_approx, windspeeds_approx, powers_approx \
-            = run(method_dict, n)
+            = results
         mean.append(mean_data)
         std.append(std_data)
         samples.append(N)
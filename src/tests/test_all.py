@@ -1,7 +1,25 @@
 # content of test_rectangle.py
+import os
 import json
+import shutil
+import tempfile
+import numpy as np
+import chaospy as cp
+from scipy.integrate import quad
+from scipy.stats import norm
+import statistics_convergence
 from statistics_convergence import run
+from openmdao.api import Problem, Group, IndepVarComp
+from statisticsComponents import dakota_projection, chaospy_projection, RectStatistics, ChaospyStatistics, \
+    objective_std_factor, BatchStatistics, LayoutMUX, weighted_statistics, sobol_indices, rqmc_standard_error, \
+    RobustObjective, weighted_tail
 import distributions
+import points_cache
+import windfarm_setup
+import quadrature
+import qmc
+import dakotaInterface
+from dakotaResults import readDakotaResults
 
 def assertions(test, baseline):
     assert test['samples'] == baseline['samples']
@@ -14,6 +32,27 @@ def assertions(test, baseline):
     assert test['windspeeds'] == baseline['windspeeds']
     assert test == baseline
 
+
+def assertions_statistics(test, baseline, rtol):
+    # As assertions, but the mean and std agree to the relative tolerance rtol
+    for key in ['mean', 'std']:
+        assert abs(test[key][0] - baseline[key][0]) <= rtol*abs(baseline[key][0])
+    test = dict(test, mean=baseline['mean'], std=baseline['std'])
+    assertions(test, baseline)
+
+
+def run_test(method_dict, n):
+    # The results of run in the format of the records
+    mean, std, N, winddirections, windspeeds, power, \
+        winddirections_approx, windspeeds_approx, power_approx \
+            = run(method_dict, n)
+    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
+           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
+           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
+           'layout': method_dict['layout']}
+    return obj
+
+
 def get_method_dict():
     method_dict = {'method': 'dakota',
                    'wake_model': 'floris',
@@ -23,6 +62,7 @@ def get_method_dict():
                    'Noffset': 10,
                    'dakota_filename': 'tests/dakotageneral.in',  # 'tests/dakotageneralPy.in'
                    'coeff_method': 'quadrature',
+                   'points_cache': False,  # Always regenerate the points
                    'windspeed_ref': 8,
                    'winddirection_ref': 225}
     return method_dict
@@ -52,14 +92,7 @@ def test_dakota_direction_expansion():
     jsonfile = open('tests/record_test_dakota_direction_expansion.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
+    test = run_test(method_dict, n)
     assertions(test, baseline)
 
 
@@ -72,15 +105,10 @@ def test_dakota_direction_quadrature_offset1():
     jsonfile = open('tests/record_test_dakota_direction_quadrature_offset1.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
-    assertions(test, baseline)
+    # The default in process expansion projects the powers at Dakota's points with its weights
+    assertions(run_test(method_dict, n), baseline)
+    method_dict['dakota_statistics'] = 'dakota'
+    assertions(run_test(method_dict, n), baseline)
 
 
 def test_dakota_direction_quadrature():
@@ -91,15 +119,10 @@ def test_dakota_direction_quadrature():
     jsonfile = open('tests/record_test_dakota_direction_quadrature.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
-    assertions(test, baseline)
+    # The default in process expansion projects the powers at Dakota's points with its weights
+    assertions(run_test(method_dict, n), baseline)
+    method_dict['dakota_statistics'] = 'dakota'
+    assertions(run_test(method_dict, n), baseline)
 
 
 def test_dakota_direction_sparse():
@@ -111,14 +134,7 @@ def test_dakota_direction_sparse():
     jsonfile = open('tests/record_test_dakota_direction_sparse.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
+    test = run_test(method_dict, n)
     assertions(test, baseline)
 
 
@@ -131,15 +147,10 @@ def test_dakota_speed_quadrature():
     jsonfile = open('tests/record_test_dakota_speed_quadrature.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
-    assertions(test, baseline)
+    # The default in process expansion projects the powers at Dakota's points with its weights
+    assertions(run_test(method_dict, n), baseline)
+    method_dict['dakota_statistics'] = 'dakota'
+    assertions(run_test(method_dict, n), baseline)
 
 
 def test_chaospy_speed_quadrature():
@@ -152,15 +163,11 @@ def test_chaospy_speed_quadrature():
     jsonfile = open('tests/record_test_chaospy_speed_quadrature.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
-    assertions(test, baseline)
+    # The record is of the expansion fitted by chaospy, the default precomputed
+    # projection agrees with it to roundoff
+    assertions_statistics(run_test(method_dict, n), baseline, 1e-12)
+    method_dict['chaospy_statistics'] = 'fit'
+    assertions(run_test(method_dict, n), baseline)
 
 
 def test_rect_direction_30points():
@@ -172,14 +179,7 @@ def test_rect_direction_30points():
     jsonfile = open('tests/record_test_rect_direction_30points.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
+    test = run_test(method_dict, n)
     assertions(test, baseline)
 
 
@@ -193,14 +193,7 @@ def test_rect_direction_amalia():
     jsonfile = open('tests/record_test_rect_direction_amalia.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
+    test = run_test(method_dict, n)
     assertions(test, baseline)
 
 
@@ -214,14 +207,7 @@ def test_rect_direction_grid():
     jsonfile = open('tests/record_test_rect_direction_grid.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
+    test = run_test(method_dict, n)
     assertions(test, baseline)
 
 
@@ -235,14 +221,7 @@ def test_rect_direction_offset1():
     jsonfile = open('tests/record_test_rect_direction_offset1.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
+    test = run_test(method_dict, n)
     assertions(test, baseline)
 
 
@@ -256,14 +235,7 @@ def test_rect_direction_random():
     jsonfile = open('tests/record_test_rect_direction_random.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
+    test = run_test(method_dict, n)
     assertions(test, baseline)
 
 
@@ -276,14 +248,7 @@ def test_rect_direction():  # This is for the optimized layout
     jsonfile = open('tests/record_test_rect_direction.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
+    test = run_test(method_dict, n)
     assertions(test, baseline)
 
 
@@ -297,16 +262,740 @@ def test_rect_speed():
     jsonfile = open('tests/record_test_rect_speed.json','r')
     baseline = json.load(jsonfile)
     jsonfile.close()
-    mean, std, N, winddirections, windspeeds, power, \
-        winddirections_approx, windspeeds_approx, power_approx \
-            = run(method_dict, n)
-    obj = {'mean': [mean], 'std': [std], 'samples': [N], 'winddirections': winddirections.tolist(),
-           'windspeeds': windspeeds.tolist(), 'power': power.tolist(),
-           'method': method_dict['method'], 'uncertain_variable': method_dict['uncertain_var'],
-           'layout': method_dict['layout']}
-    test = obj
+    test = run_test(method_dict, n)
     assertions(test, baseline)
 
 
+def test_amalia_cdf_exact():
+    windrose = distributions.amaliaWindRose()
+    x = np.array([0., 50., 110., 125., 140., 225., 300., 360.])
+    cdf = windrose.cdf(x)
+
+    def integral(xi):
+        # Integrate each side of the zero probability region separately
+        f = lambda t: windrose.pdf(t)[0]
+        return quad(f, 0, min(xi, 110))[0] + quad(f, 140, max(xi, 140))[0]
+
+    for xi, F in zip(x, cdf):
+        assert abs(F - integral(xi)/integral(360)) < 1e-12
+    q = np.linspace(0, 1, 101)
+    assert np.max(np.abs(windrose.cdf(windrose.ppf(q)) - q)) < 1e-12
+
+
+def test_windrose_file_cache():
+    # The wind rose file is read once, and again after it is modified
+    tmpdir = tempfile.mkdtemp()
+    loadtxt = np.loadtxt
+    reads = []
+    np.loadtxt = lambda *args, **kwargs: reads.append(args[0]) or loadtxt(*args, **kwargs)
+    try:
+        windrose_file = os.path.join(tmpdir, 'windrose_amalia_8ms.txt')
+        shutil.copy('../WindRoses/windrose_amalia_8ms.txt', windrose_file)
+        windrose = distributions.amaliaWindRoseRaw(windrose_file)
+        x = np.linspace(0, 360, 721)
+        pdf = windrose.pdf(x)
+        cdf = windrose.cdf(x)
+        for i in range(3):
+            windrose.pdf(x)
+            windrose.cdf(x)
+            distributions.amaliaWindRoseRaw(windrose_file).cdf(x)
+        assert len(reads) == 1
+
+        # Double the probabilities, the file has a later modification time
+        data = loadtxt(windrose_file)
+        data[:, 2] *= 2
+        np.savetxt(windrose_file, data)
+        mtime = os.path.getmtime(windrose_file) + 10
+        os.utime(windrose_file, (mtime, mtime))
+        assert np.max(np.abs(windrose.pdf(x) - 2*pdf)) < 1e-12
+        assert np.max(np.abs(windrose.cdf(x) - 2*cdf)) < 1e-12
+        assert len(reads) == 2
+    finally:
+        np.loadtxt = loadtxt
+        shutil.rmtree(tmpdir)
+
+    # The cdf on an array is the integral of the pdf up to each point
+    windrose = distributions.amaliaWindRoseRaw()
+    nodes = windrose._wind_rose_func().x
+    x = np.array([0., 2.5, 50., 112.5, 125., 137., 225., 300., 357.5, 360.])
+    cdf = windrose.cdf(x)
+    for xi, F in zip(x, cdf):
+        integral = quad(lambda t: windrose.pdf(t)[0], 0, xi, points=nodes[(nodes > 0) & (nodes < xi)], limit=200)[0]
+        assert abs(F - integral) < 1e-10
+
+
+def test_points_cache():
+    method_dict = get_method_dict()
+    method_dict['method'] = 'rect'
+    method_dict['uncertain_var'] = 'speed'
+    method_dict = add_distribution(method_dict)
+    method_dict['points_cache'] = True
+
+    cache_dir = points_cache.cache_dir
+    points_cache.cache_dir = tempfile.mkdtemp()
+    try:
+        points = windfarm_setup.getPoints(method_dict, 5)
+        assert len(os.listdir(points_cache.cache_dir)) == 1
+        cached = windfarm_setup.getPoints(method_dict, 5)
+        method_dict['points_cache'] = False
+        generated = windfarm_setup.getPoints(method_dict, 5)
+    finally:
+        shutil.rmtree(points_cache.cache_dir)
+        points_cache.cache_dir = cache_dir
+    for key in ['winddirections', 'windspeeds', 'weights']:
+        assert cached[key].tolist() == points[key].tolist() == generated[key].tolist()
+
+    # A change to the source of the modules that generate the points changes the key
+    key = points_cache.get_key(method_dict, 5)
+    source_hash = points_cache._source_hash
+    points_cache._source_hash = 'changed'
+    try:
+        assert points_cache.get_key(method_dict, 5) != key
+    finally:
+        points_cache._source_hash = source_hash
+
+
+def test_dakota_statistics_in_process():
+    # The in process expansion agrees with the statistics computed by Dakota
+    method_dict = get_method_dict()
+    method_dict['points_backend'] = 'numpy'
+    method_dict['points_cache'] = False
+    method_dict = add_distribution(method_dict)
+    windfarm_setup.getPoints(method_dict, 5)  # Sets the histogram bins in method_dict
+
+    jsonfile = open('tests/record_test_dakota_direction_quadrature.json','r')
+    baseline = json.load(jsonfile)
+    jsonfile.close()
+    projection, multi_index = dakota_projection(method_dict['dakota_histogram'])
+    coeff = projection.dot(baseline['power'])
+    mean = coeff[0]*8760/1e6
+    std = np.sqrt(np.sum(coeff[1:]**2))*8760/1e6
+    assert abs(mean - baseline['mean'][0]) < 1e-4*baseline['mean'][0]
+    assert abs(std - baseline['std'][0]) < 1e-4*baseline['std'][0]
+
+    # The projection is at the points and with the weights of the quadrature that was used
+    histogram = method_dict['dakota_histogram']
+    assert np.allclose(projection.dot(projection.T/histogram['weights'][:, None]), np.eye(5))
+    points = histogram['points'] + 1e-3
+    weights = histogram['weights']*np.linspace(0.9, 1.1, 5)
+    projection, multi_index = dakota_projection(dict(histogram, points=points, weights=weights))
+    assert np.allclose(projection[0], weights)
+    psi = quadrature.histogram_polynomials(histogram['abscissas'][0], histogram['ordinates'][0], 5, points[0])
+    assert np.allclose(projection, (psi*weights[:, None]).T)
+
+
+def test_chaospy_statistics_projection():
+    # The precomputed projection agrees with the expansion fitted by chaospy
+    method_dict = get_method_dict()
+    method_dict['uncertain_var'] = 'speed'
+    method_dict = add_distribution(method_dict)
+    dist = method_dict['distribution']
+    n = 5
+
+    jsonfile = open('tests/record_test_chaospy_speed_quadrature.json','r')
+    baseline = json.load(jsonfile)
+    jsonfile.close()
+    power = np.array(baseline['power'])
+    points, weights = cp.generate_quadrature(order=n-1, domain=dist, rule='G')
+    poly = cp.orth_ttr(n-1, dist)
+    expansion = cp.fit_quadrature(poly, points, weights, power)
+    projection, norms, multi_index = chaospy_projection(dist, n)
+    coeff = projection.dot(power)
+    mean = cp.E(expansion, dist, rule='G')
+    std = cp.Std(expansion, dist, rule='G')
+    assert abs(coeff[0] - mean) < 1e-12*mean
+    assert abs(np.sqrt(np.sum(coeff[1:]**2 * norms[1:])) - std) < 1e-12*std
+
+
+def test_std_derivatives():
+    # The analytic derivatives of the statistics, with the truncation of the speed, agree with finite differences
+    n = 6
+    method_dict = get_method_dict()
+    method_dict['method'] = 'rect'
+    method_dict['uncertain_var'] = 'speed'
+    method_dict = add_distribution(method_dict)
+    points = windfarm_setup.getPoints(method_dict, n)
+
+    for comp in [RectStatistics(nDirections=n, method_dict=method_dict),
+                 ChaospyStatistics(nDirections=n, method_dict=method_dict)]:
+        prob = Problem(root=Group())
+        prob.root.add('p', IndepVarComp('dirPowers', np.linspace(200.0, 1500.0, n)))
+        prob.root.add('w', IndepVarComp('windWeights', points['weights']))
+        prob.root.add('AEPcomp', comp)
+        prob.root.connect('p.dirPowers', 'AEPcomp.dirPowers')
+        prob.root.connect('w.windWeights', 'AEPcomp.windWeights')
+        prob.setup(check=False)
+        prob.run()
+        data = prob.check_partial_derivatives(out_stream=None)
+        for output in ['mean', 'std']:
+            assert data['AEPcomp'][(output, 'dirPowers')]['rel error'][0] < 1e-5
+
+
+def test_objective_std_factor():
+    # The quantile and the conditional value at risk of a normal AEP
+    mean = 1400.0
+    std = 100.0
+    c = objective_std_factor({'objective': 'normal_quantile', 'objective_level': 0.9})
+    assert abs(norm.sf(mean - c*std, mean, std) - 0.9) < 1e-12
+    c = objective_std_factor({'objective': 'normal_cvar', 'objective_level': 0.9})
+    q = norm.ppf(0.1, mean, std)
+    cvar = quad(lambda x: x*norm.pdf(x, mean, std), -np.inf, q)[0]/0.1
+    assert abs(mean - c*std - cvar) < 1e-8*mean
+    assert objective_std_factor({'objective': 'mean_std', 'objective_k': 2.0}) == 2.0
+    assert objective_std_factor({}) == 0.0
+    for level in [0.0, 1.0, 90.0]:
+        try:
+            objective_std_factor({'objective': 'normal_quantile', 'objective_level': level})
+            assert False
+        except ValueError:
+            pass
+
+
+def test_robust_objective():
+    # The objective and its total derivative for the powers of a small problem
+    power = np.array([1000., 1200., 900., 1500.])
+    weights = np.array([0.1, 0.2, 0.3, 0.4])
+    for objective in ['mean', 'mean_std', 'normal_quantile', 'normal_cvar']:
+        method_dict = {'method': 'rect', 'uncertain_var': 'direction', 'objective': objective}
+        prob = Problem(Group())
+        prob.root.add('power', IndepVarComp('dirPowers', power), promotes=['*'])
+        prob.root.add('weights', IndepVarComp('windWeights', weights), promotes=['*'])
+        prob.root.add('statistics', RectStatistics(nTurbines=2, nDirections=power.size, method_dict=method_dict),
+                      promotes=['*'])
+        prob.root.add('obj_comp', RobustObjective(method_dict), promotes=['*'])
+        prob.setup(check=False)
+        prob.run()
+
+        c = objective_std_factor(method_dict)
+        mean = 8760*np.sum(weights*power)
+        std = 8760*np.sqrt(np.sum(weights*(power - np.sum(weights*power))**2))
+        assert abs(prob['obj'] + mean - c*std) < 1e-12*mean
+        dstd = 8760**2*weights*(power - mean/8760)/std
+        expected = -(8760*weights - c*dstd)
+        J = prob.calc_gradient(['dirPowers'], ['obj'], return_format='array')
+        assert np.max(np.abs(J[0] - expected)) < 1e-10*np.max(np.abs(expected))
+
+
+def test_empirical_objective():
+    # The quantile and the cvar of the weighted samples, and their gradients
+    power = np.array([1000., 1200., 900., 1500.])
+    weights = np.array([0.1, 0.2, 0.3, 0.4])
+    # In increasing order 900 (0.3), 1000 (0.1), 1200 (0.2), 1500 (0.4), the
+    # cumulative weight reaches 0.5 at 1200
+    expected = {'quantile': 1200., 'cvar': (0.3*900 + 0.1*1000 + 0.1*1200)/0.5}
+    for objective in ['quantile', 'cvar']:
+        method_dict = {'method': 'rect', 'uncertain_var': 'direction', 'objective': objective,
+                       'objective_level': 0.5}
+        prob = Problem(Group())
+        prob.root.add('power', IndepVarComp('dirPowers', power), promotes=['*'])
+        prob.root.add('weights', IndepVarComp('windWeights', 2*weights), promotes=['*'])
+        prob.root.add('obj_comp', RobustObjective(method_dict, nDirections=power.size), promotes=['*'])
+        prob.setup(check=False)
+        prob.run()
+        assert abs(prob['obj'] + 8760*expected[objective]) < 1e-12*8760*expected[objective]
+
+        # Away from the changes of order the gradients are those of finite differences
+        J = prob.calc_gradient(['dirPowers', 'windWeights'], ['obj'], return_format='array')[0]
+        h = 1e-3
+        fd = np.zeros(2*power.size)
+        for i in range(2*power.size):
+            for sign in [1, -1]:
+                x = np.concatenate([power, 2*weights])
+                x[i] += sign*h
+                fd[i] -= sign*8760*weighted_tail(x[:power.size], x[power.size:], 0.5)[objective]/(2*h)
+        assert np.max(np.abs(J - fd)) < 1e-6*np.max(np.abs(fd))
+
+    # The truncated speeds are samples of zero power
+    tail = weighted_tail([0., 900., 1200.], [0.2, 0.4, 0.4], 0.5)
+    assert tail['quantile'] == 900.
+    assert abs(tail['cvar'] - 0.3*900/0.5) < 1e-12
+    try:
+        RobustObjective({'objective': 'cvar', 'objective_level': 1.5})
+        assert False
+    except ValueError:
+        pass
+
+
+def test_batch_statistics():
+    # The statistics of several layouts at once agree with those of each layout
+    n = 6
+    nLayouts = 3
+    method_dict = get_method_dict()
+    method_dict['method'] = 'rect'
+    method_dict['uncertain_var'] = 'speed'
+    method_dict = add_distribution(method_dict)
+    points = windfarm_setup.getPoints(method_dict, n)
+    powers = np.array([np.linspace(200.0, 1500.0, n), np.linspace(1500.0, 200.0, n), np.linspace(0.0, 500.0, n)**2/250.0])
+
+    prob = Problem(root=Group())
+    for i in range(nLayouts):
+        prob.root.add('p%i' % i, IndepVarComp('dirPowers', powers[i]))
+        prob.root.connect('p%i.dirPowers' % i, 'layoutMUX.dirPowers%i' % i)
+    prob.root.add('w', IndepVarComp('windWeights', points['weights']))
+    prob.root.add('layoutMUX', LayoutMUX(nLayouts, n))
+    prob.root.add('AEPcomp', BatchStatistics(nLayouts, n, method_dict))
+    prob.root.connect('layoutMUX.layoutPowers', 'AEPcomp.layoutPowers')
+    prob.root.connect('w.windWeights', 'AEPcomp.windWeights')
+    prob.setup(check=False)
+    prob.run()
+    for i in range(nLayouts):
+        mean, std = weighted_statistics(powers[i], points['weights'], method_dict)
+        assert abs(prob['AEPcomp.mean'][i] - mean) < 1e-12*mean
+        assert abs(prob['AEPcomp.std'][i] - std) < 1e-9*mean
+    data = prob.check_partial_derivatives(out_stream=None)
+    for output in ['mean', 'std']:
+        assert data['AEPcomp'][(output, 'layoutPowers')]['rel error'][0] < 1e-5
+
+    method_dict['method'] = 'chaospy'
+    comp = BatchStatistics(nLayouts, n, method_dict)
+    unknowns = {}
+    comp.solve_nonlinear({'layoutPowers': powers, 'method_dict': method_dict}, unknowns, {})
+    single = ChaospyStatistics(n, method_dict)
+    for i in range(nLayouts):
+        statistics = {}
+        single.solve_nonlinear({'dirPowers': powers[i], 'method_dict': method_dict}, statistics, {})
+        assert abs(unknowns['mean'][i] - statistics['mean']) < 1e-12*statistics['mean']
+        assert abs(unknowns['std'][i] - statistics['std']) < 1e-9*statistics['mean']
+
+
+def test_sobol_indices():
+    # Sobol indices of the direction and the speed from the coefficients of the Dakota quadrature expansion
+    method_dict = get_method_dict()
+    method_dict['uncertain_var'] = 'direction_and_speed'
+    method_dict['points_backend'] = 'numpy'
+    method_dict['points_cache'] = False
+    method_dict['distribution'] = cp.J(distributions.getWindRose(), distributions.getWeibull())
+    points = windfarm_setup.getPoints(method_dict, 4)  # Sets the histogram bins in method_dict
+    f = 1 + np.sin(np.radians(points['winddirections']))
+    g = points['windspeeds']**3
+
+    projection, multi_index = dakota_projection(method_dict['dakota_histogram'])
+    norms = np.ones(projection.shape[0])
+    main, total = sobol_indices(projection.dot(1000*f), norms, multi_index)
+    assert np.allclose(main, [1, 0]) and np.allclose(total, [1, 0])
+    main, total = sobol_indices(projection.dot(100*f + g), norms, multi_index)
+    assert np.allclose(main, total) and abs(np.sum(main) - 1) < 1e-12
+    main, total = sobol_indices(projection.dot(f*g), norms, multi_index)
+    assert np.all(main < total) and abs(total[0] + main[1] - 1) < 1e-12
+
+
+def test_adaptive_convergence():
+    # The adaptive directions converge for a power with a narrow wake and stop before adaptive_max
+    def power(x):
+        x = np.asarray(x, dtype=float)
+        return 1000 + 300*np.cos(np.radians(x - 200)) - 400*np.exp(-((x - 270 + 180) % 360 - 180)**2/(2*5.**2))
+
+    dist = distributions.getWindRose()
+    pdf = lambda x: dist._pdf(np.array([x]))[0]
+    exact = quad(lambda x: power(x)*pdf(x), 0, 360, points=[110, 140, 225, 270], limit=500)[0]
+    method_dict = {'uncertain_var': 'direction', 'offset': 0, 'Noffset': 10, 'adaptive_max': 100}
+
+    errors = []
+    for tol in [1e-2, 1e-3]:
+        method_dict['adaptive_tol'] = tol
+        x, w, p = windfarm_setup.getPointsAdaptive(dist, method_dict, 20, power)
+        assert x.size < method_dict['adaptive_max']
+        assert abs(np.sum(w) - 1) < 1e-12
+        errors.append(abs(np.sum(w*p) - exact)/exact)
+        assert errors[-1] < tol
+    assert errors[1] < errors[0]
+
+    method_dict['uncertain_var'] = 'speed'
+    try:
+        windfarm_setup.getPointsAdaptive(dist, method_dict, 20, power)
+        assert False, 'The adaptive method only bins the direction'
+    except ValueError:
+        pass
+
+
+def test_numpy_points_backend():
+    # The numpy quadrature points agree with the recorded Dakota points to numpy_points_tolerance relative
+    for record, uncertain_var, offset in [('dakota_direction_quadrature', 'direction', 0),
+                                          ('dakota_direction_quadrature_offset1', 'direction', 1),
+                                          ('dakota_speed_quadrature', 'speed', 0)]:
+        jsonfile = open('tests/record_test_%s.json' % record, 'r')
+        baseline = json.load(jsonfile)
+        jsonfile.close()
+        method_dict = get_method_dict()
+        method_dict['uncertain_var'] = uncertain_var
+        method_dict['offset'] = offset
+        method_dict['points_backend'] = 'numpy'
+        method_dict = add_distribution(method_dict)
+        points = windfarm_setup.getPoints(method_dict, baseline['samples'][0])
+        for key in ['winddirections', 'windspeeds']:
+            dakota = np.array(baseline[key])
+            assert np.max(np.abs(points[key] - dakota)/np.abs(dakota)) < windfarm_setup.numpy_points_tolerance
+        assert abs(np.sum(points['weights']) - 1) < 1e-12
+
+    # Dakota computes the points unless the numpy backend is asked for
+    getSamplePoints = windfarm_setup.getSamplePoints
+    calls = []
+    windfarm_setup.getSamplePoints = lambda dakotaInput: calls.append(dakotaInput) or ([[0.0]], np.ones(1))
+    try:
+        method_dict = add_distribution(get_method_dict())
+        x, f = np.linspace(-1, 1, 3), np.ones(2)
+        windfarm_setup.getDakotaPoints(method_dict, 1, x, f)
+        assert len(calls) == 1
+        method_dict['points_backend'] = 'numpy'
+        x_numpy, w_numpy = windfarm_setup.getDakotaPoints(method_dict, 1, x, f)
+        assert len(calls) == 1
+        assert abs(x_numpy[0][0]) < 1e-12 and abs(w_numpy[0] - 1) < 1e-12
+    finally:
+        windfarm_setup.getSamplePoints = getSamplePoints
+
+
+def test_sparse_grid():
+    # The sparse grid weights sum to 1 and integrate a separable polynomial exactly
+    dist_dir = distributions.getWindRose()
+    dist_speed = distributions.getWeibull()
+    lo, hi = dist_speed.range()[0][0], dist_speed.range()[1][0]
+    pdf = lambda s: dist_speed._pdf(np.array([s]))[0]
+    moments = [quad(lambda s: s**k*pdf(s), lo, hi)[0] for k in range(3)]
+    g = lambda d: np.cos(np.radians(d))
+    h = lambda s: 1 + s + s**2/10.
+    method_dict = {'uncertain_var': 'direction_and_speed', 'offset': 0, 'Noffset': 10}
+
+    for method in ['rect', 'nested']:
+        method_dict['method'] = method
+        for level in [1, 2, 3]:
+            d, s, w = windfarm_setup.getPointsSparseGrid(dist_dir, dist_speed, method_dict, level)
+            assert abs(np.sum(w) - 1) < 1e-12
+            # A function of one variable integrates as its finest 1d rule
+            size = 3**level if method == 'rect' else level
+            x_d, w_d = windfarm_setup.getPointsDirection(dist_dir, method_dict, size)
+            x_s, w_s = windfarm_setup.getPointsSpeed(dist_speed, method_dict, size)
+            assert abs(np.sum(w*g(d)) - np.sum(w_d*g(x_d))/np.sum(w_d)) < 1e-12
+            assert abs(np.sum(w*h(s)) - np.sum(w_s*h(x_s))/np.sum(w_s)) < 1e-12
+            if method == 'nested':
+                # The Clenshaw-Curtis speed rules from level 1 are exact for quadratics
+                exact = (moments[0] + moments[1] + moments[2]/10.)/moments[0]
+                assert abs(np.sum(w*h(s)) - exact) < 1e-8*exact
+
+
+def test_kronrod_clenshaw_curtis():
+    # The nested rules integrate the polynomials of their degree exactly and contain the coarser points
+    t, dt = quadrature.composite_gauss_legendre(0.0, 2.0)
+    lam = (1 + t + np.sin(t)) * dt
+    moment = lambda k: np.sum(t**k*lam)
+
+    n = 3
+    x_g, w_g = quadrature.gauss(t, lam, n)
+    x_k, w_k = quadrature.kronrod(t, lam, n)
+    assert x_k.size == 2*n+1
+    for x_i in x_g:
+        assert np.min(np.abs(x_k - x_i)) < 1e-10
+    for k in range(3*n+2):
+        assert abs(np.sum(w_k*x_k**k) - moment(k)) < 1e-10*moment(k)
+
+    for m in [2, 4, 8]:
+        x, w = quadrature.clenshaw_curtis(t, lam, m, 0.0, 2.0)
+        x_fine, unused = quadrature.clenshaw_curtis(t, lam, 2*m, 0.0, 2.0)
+        assert x.size == m+1
+        for x_i in x:
+            assert np.min(np.abs(x_fine - x_i)) < 1e-12
+        for k in range(m+1):
+            assert abs(np.sum(w*x**k) - moment(k)) < 1e-10*moment(k)
+
+
+def test_fourier_weights():
+    # The periodic weights integrate a trigonometric polynomial of degree below n/2 exactly
+    rng = np.random.RandomState(1)
+    cells = 12
+    edges = np.linspace(0, 2*np.pi, cells+1)
+    density = rng.uniform(0.5, 1.5, cells)
+    density /= np.sum(density*np.diff(edges))
+    F = np.concatenate([[0], np.cumsum(density*np.diff(edges))])
+
+    f = lambda theta: 1 + np.cos(2*theta) + 0.5*np.sin(3*theta - 0.3)
+    antiderivative = lambda theta: theta + np.sin(2*theta)/2 - 0.5*np.cos(3*theta - 0.3)/3
+    exact = np.sum(density*np.diff(antiderivative(edges)))
+
+    for n in [7, 8, 16]:
+        theta = 2*np.pi*np.arange(n)/n + 0.1
+        phi = quadrature.characteristic_coefficients(F, n//2)
+        w = quadrature.fourier_weights(theta, phi)
+        assert abs(np.sum(w) - 1) < 1e-12
+        assert abs(np.sum(w*f(theta)) - exact) < 1e-12
+
+
+def test_sobol_joe_kuo():
+    # The first points of the unscrambled Sobol sequence, as in the Joe and Kuo reference generator
+    reference = np.array([[0, 0, 0],
+                          [0.5, 0.5, 0.5],
+                          [0.75, 0.25, 0.25],
+                          [0.25, 0.75, 0.75],
+                          [0.375, 0.375, 0.625],
+                          [0.875, 0.875, 0.125],
+                          [0.625, 0.125, 0.875],
+                          [0.125, 0.625, 0.375]])
+    X = qmc.sobol(8, 3)
+    assert np.max(np.abs(X - reference)) < 1e-9
+
+
+def test_rqmc_standard_error():
+    # The standard error of the randomized QMC mean shrinks with the number of replicates
+    def power(x):
+        return 1000 + 300*np.cos(np.radians(x - 200))
+
+    dist = distributions.getWindRose()
+    pdf = lambda x: dist._pdf(np.array([x]))[0]
+    exact = quad(lambda x: power(x)*pdf(x), 0, 360, points=[110, 140, 225, 270], limit=500)[0]*8760
+    method_dict = {'method': 'qmc', 'uncertain_var': 'direction', 'distribution': dist, 'windspeed_ref': 8}
+
+    errors = []
+    for replicates in [16, 64, 256]:
+        method_dict['qmc_replicates'] = replicates
+        points = windfarm_setup.getPointsQMC(method_dict, 32)
+        p = power(points['winddirections'])
+        mean, std = weighted_statistics(p, points['weights'], method_dict)
+        se_mean, se_std = rqmc_standard_error(p, points['weights'], replicates, method_dict)
+        assert abs(mean - exact) < 4*se_mean
+        errors.append(se_mean)
+    # It goes as 1/sqrt(replicates)
+    assert errors[0] > 1.4*errors[1] > 1.4**2*errors[2]
+
+
+def test_dakota_batch_files():
+    # Round trip of a batch parameters file to the results file read by Dakota
+    evaluation = """                                          1 variables
+                      %s x1
+                                          1 functions
+                                          1 ASV_1:power
+                                          1 derivative_variables
+                                          1 DVV_1:x1
+                                          0 analysis_components
+                                        %s eval_id
+"""
+    directions = [2.404799999999999e+02, 5.037e+01, -1.2e-3]
+    workdir = tempfile.mkdtemp()
+    try:
+        paramsfilename = os.path.join(workdir, 'params.in')
+        f = open(paramsfilename, 'w')
+        for i, x in enumerate(directions):
+            f.write(evaluation % (repr(x), '1:%d' % (i+1)))
+        f.close()
+        paramsdicts = dakotaInterface.parseDakotaBatchParametersFile(paramsfilename)
+        assert [float(paramsdict['x1']) for paramsdict in paramsdicts] == directions
+        assert [dakotaInterface.evaluationIndex(paramsdict['eval_id']) for paramsdict in paramsdicts] == [0, 1, 2]
+
+        power = [1234.5678901234567, 0.1, 3e10]
+        resultsdicts = [{'fns': [p], 'fnGrads': []} for p in power]
+        active_set_vectors = [[int(paramsdict['ASV_1:power'])] for paramsdict in paramsdicts]
+        resultsfilename = os.path.join(workdir, 'results.out')
+        dakotaInterface.writeDakotaBatchResultsFile(resultsfilename, resultsdicts, paramsdicts, active_set_vectors)
+        f = open(resultsfilename)
+        evaluations = f.read().split('#\n')
+        f.close()
+        assert [float(e.split()[0]) for e in evaluations] == power
+        assert all(e.split()[1] == 'f0' for e in evaluations)
+    finally:
+        shutil.rmtree(workdir)
+
+    # Only the first batch maps to the power vector
+    assert dakotaInterface.evaluationIndex('7') == 6
+    try:
+        dakotaInterface.evaluationIndex('2:1')
+        assert False, 'The second batch is not in the power vector'
+    except ValueError:
+        pass
+
+
+def test_dakota_seed():
+    # The regression seed is the same for the same input and differs otherwise
+    def seed(sample_number, f):
+        workdir = tempfile.mkdtemp()
+        try:
+            method_dict = get_method_dict()
+            method_dict['coeff_method'] = 'regression'
+            method_dict['dakota_workdir'] = workdir
+            dakotaInterface.updateDakotaFile(method_dict, sample_number, x, f)
+            keywords = dakotaInterface.parseDakotaInputFile(dakotaInterface.getDakotaInput(method_dict))
+        finally:
+            shutil.rmtree(workdir)
+        return keywords['seed']
+
+    x = np.linspace(0, 360, 11)
+    f = np.linspace(1, 2, 10)
+    f = f/np.sum(f*np.diff(x))
+    assert seed(5, f) == seed(5, f)
+    assert seed(5, f) != seed(6, f)
+    assert seed(5, f) != seed(5, f[::-1])
+
+
+def test_run_offsets():
+    # The offsets batch gives the statistics of each offset, with the coinciding points evaluated once
+    def power(winddirections, windspeeds):
+        return 1000 + 300*np.cos(np.radians(winddirections - 200)) + 10*windspeeds
+
+    evaluated = []
+    def solve_problem(method_dict, winddirections, windspeeds, weights):
+        evaluated.append(winddirections.size)
+        return {'dirPowers': power(winddirections, windspeeds)}
+
+    method_dict = get_method_dict()
+    method_dict['method'] = 'rect'
+    method_dict['Noffset'] = 4
+    method_dict = add_distribution(method_dict)
+    solve = statistics_convergence.solve_problem
+    statistics_convergence.solve_problem = solve_problem
+    try:
+        results = statistics_convergence.run_offsets(method_dict, 10)
+    finally:
+        statistics_convergence.solve_problem = solve
+    assert len(evaluated) == 1
+    assert len(results) == method_dict['Noffset']
+
+    for offset, result in enumerate(results):
+        offset_dict = dict(method_dict, offset=offset)
+        points = windfarm_setup.getPoints(offset_dict, 10)
+        mean, std = weighted_statistics(power(points['winddirections'], points['windspeeds']), points['weights'],
+                                        offset_dict)
+        assert abs(result[0] - mean/1e6) < 1e-12*abs(mean/1e6)
+        assert abs(result[1] - std/1e6) < 1e-12*abs(std/1e6)
+        assert np.all(result[3] == points['winddirections'])
+
+
+def test_distribution_registry():
+    # The same parameters give the same distribution, its key is kept outside of it
+    assert distributions.getWeibull() is distributions.getWeibull()
+    assert distributions.getWeibull(a=2.0) is not distributions.getWeibull()
+    dist = distributions.getWindRose()
+    assert not hasattr(dist, 'registry_key')
+    key = distributions.distribution_key(dist)
+    assert distributions.distribution_key(distributions.getWindRose()) == key
+    joint = cp.J(dist, distributions.getWeibull())
+    assert distributions.distribution_key(joint) == (key, distributions.distribution_key(distributions.getWeibull()))
+
+
+def test_windrose():
+    # The tabulated wind roses are distributions on [0, 360), their cdf and ppf invert each other
+    for windrose_file in ['../WindRoses/windrose_lissett_single_average_speed.txt',
+                          '../WindRoses/windrose_amalia_directionally_averaged_speeds.txt']:
+        windrose = distributions.WindRose(windrose_file)
+        edges = windrose.edges
+        total = sum(quad(lambda x: windrose.pdf(x)[0], edges[i], edges[i+1])[0] for i in range(edges.size-1))
+        assert abs(total - 1) < 1e-12
+        x = np.linspace(0.25, 359.75, 720)
+        x = x[windrose.pdf(x) > 0]  # The cdf is flat on the sectors without wind
+        assert np.max(np.abs(windrose.ppf(windrose.cdf(x)) - x)) < 1e-10
+        q = np.linspace(0, 1, 101)
+        assert np.max(np.abs(windrose.cdf(windrose.ppf(q)) - q)) < 1e-12
+
+    # The directions must start at 0
+    tmpdir = tempfile.mkdtemp()
+    try:
+        windrose_file = os.path.join(tmpdir, 'windrose.txt')
+        np.savetxt(windrose_file, [[5.0, 8.0, 0.5], [185.0, 8.0, 0.5]])
+        try:
+            distributions.WindRose(windrose_file)
+            assert False
+        except ValueError:
+            pass
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_conditional_weibull():
+    # The conditional weibull of each direction is a truncated distribution, and the
+    # joint distribution reuses the registered wind rose
+    dist = distributions.getJointWindRoseWeibull()
+    windrose_file = '../WindRoses/windrose_amalia_directionally_averaged_speeds.txt'
+    assert dist[0] is distributions.getWindRose(windrose_file)
+    conditional = dist[1]
+    assert conditional.windrose is dist[0].windrose
+    lo, hi = conditional.bnd()
+    for direction in [0.0, 95.0, 225.0, 359.0]:
+        assert abs(conditional.cdf(lo, direction)) < 1e-12
+        assert abs(conditional.cdf(hi, direction) - 1) < 1e-12
+        assert abs(quad(lambda x: conditional.pdf(x, direction), lo, hi)[0] - 1) < 1e-10
+        x = np.linspace(0.5, 29.5, 30)
+        assert np.max(np.abs(conditional.ppf(conditional.cdf(x, direction), direction) - x)) < 1e-8
+        h = 1e-6
+        dcdf = (conditional.cdf(x+h, direction) - conditional.cdf(x-h, direction))/(2*h)
+        assert np.max(np.abs(dcdf - conditional.pdf(x, direction))) < 1e-8
+
+    # The joint pdf integrates to 1, the direction pdf is constant on each piece of the wind rose
+    edges = dist[0].windrose.edges
+    total = 0.0
+    for i in range(edges.size-1):
+        middle = (edges[i] + edges[i+1])/2.
+        total += (edges[i+1] - edges[i])*quad(lambda x: dist.pdf(np.array([[middle], [x]]))[0], lo, hi)[0]
+    assert abs(total - 1) < 1e-8
+
+
+def test_points_conditional_speed():
+    # The points give the expected speed of the truncated distribution of each sector,
+    # with 144 directions the direction bins end at the sector edges
+    dist = distributions.getJointWindRoseWeibull()
+    conditional = dist[1]
+    windrose = conditional.windrose
+    a = conditional.a
+    expected = 0.0
+    for b, probability in zip(conditional.b_sector, windrose.probability):
+        expected += probability*quad(lambda x: x*a/b*(x/b)**(a-1)*np.exp(-(x/b)**a), conditional.lo, conditional.hi)[0]
+    method_dict = {'method': 'rect', 'uncertain_var': 'direction_and_speed', 'offset': 0, 'Noffset': 10}
+    d, s, w = windfarm_setup.getPointsConditionalSpeed(dist, method_dict, 144)
+    k = conditional.get_truncation_value()
+    assert abs((1-k)*np.sum(w*s) - expected) < 1e-6*expected
+
+
+def test_work_directories():
+    # One scratch directory per run, one directory per component in it, and a single cleanup at exit
+    registered = []
+    work_directories = dakotaInterface._work_directories
+    dakotaInterface._work_directories = []
+    try:
+        first = dakotaInterface.makeWorkDirectory(register=registered.append)
+        second = dakotaInterface.makeWorkDirectory(register=registered.append)
+        assert registered == [dakotaInterface.removeWorkDirectories]
+
+        method_dict = get_method_dict()
+        workdir = dakotaInterface.getWorkDirectory(method_dict)
+        assert dakotaInterface.getWorkDirectory(method_dict) == workdir
+        components = [dakotaInterface.makeComponentDirectory(method_dict, 'statistics') for i in range(2)]
+        assert components[0] != components[1]
+        assert all(os.path.dirname(component) == workdir for component in components)
+        other = dakotaInterface.getWorkDirectory(get_method_dict())
+        assert other != workdir
+        assert dakotaInterface._work_directories == [first, second, workdir, other]
+
+        dakotaInterface.removeWorkDirectories()
+        assert not any(os.path.exists(d) for d in [first, second, workdir, other])
+    finally:
+        dakotaInterface._work_directories = work_directories
+
+
+def test_dakota_expansion_moments():
+    # The moments reported by Dakota, and those of the exported expansion only as a fallback
+    workdir = tempfile.mkdtemp()
+    try:
+        results = readDakotaResults(workdir)
+        assert results['mean'] is None and results['std'] is None
+        f = open(os.path.join(workdir, 'expansion.dat'), 'w')
+        f.write('  5.0e+03 0 0\n  3.0e+02 1 0\n -4.0e+02 0 1\n  1.2e+02 1 1\n')
+        f.close()
+        results = readDakotaResults(workdir)
+        assert results['mean'] is None  # The polynomials may not be normalized
+        assert results['multi_index'].tolist() == [[0, 0], [1, 0], [0, 1], [1, 1]]
+        results = readDakotaResults(workdir, normalized=True)
+        assert results['mean'] == 5000.0
+        assert abs(results['std'] - np.sqrt(300.**2 + 400.**2 + 120.**2)) < 1e-12*results['std']
+
+        # The quadrature expansion reports them on the line after the response, the regression on its line
+        for log in ['                            Mean           Std Dev          Skewness         Kurtosis\n'
+                    'power\n'
+                    '  expansion:    7.8968432022e+04  6.6123456789e+03  1.0e-01  2.0e+00\n',
+                    'Sample moment statistics for each response function:\n'
+                    '                            Mean           Std Dev          Skewness         Kurtosis\n'
+                    '           power  7.8968432022e+04  6.6123456789e+03  1.0e-01  2.0e+00\n']:
+            f = open(os.path.join(workdir, 'logDakota.out'), 'w')
+            f.write(log)
+            f.close()
+            results = readDakotaResults(workdir, normalized=True)
+            assert (results['mean'], results['std']) == (7.8968432022e+04, 6.6123456789e+03)
+    finally:
+        shutil.rmtree(workdir)
+
+
 if __name__ == "__main__":
     test_dakota_direction_expansion()  # works if run from the src directory
@@ -1,11 +1,39 @@
 import numpy as np
 # import matplotlib.pyplot as plt
 import chaospy as cp
-from getSamplePoints import getSamplePoints
-from dakotaInterface import updateDakotaFile
+from getSamplePoints import getSamplePoints, getSamplePointsNumpy, getHistogramBins, numpy_points_tolerance
+from dakotaInterface import updateDakotaFile, getDakotaInput, dakotaInputNeeded
+import distributions
+import quadrature
+import qmc
+import points_cache
 
 
 def getPoints(method_dict, n):
+    """Points and weights for the method.
+
+    With method_dict['points_cache'] = True (default False) they are read from
+    the points cache when possible.
+    """
+
+    if not method_dict.get('points_cache', False):
+        return generatePoints(method_dict, n)
+
+    key = points_cache.get_key(method_dict, n)
+    if key is None:
+        return generatePoints(method_dict, n)
+
+    points = points_cache.load(key, method_dict)
+    if points is None:
+        points = generatePoints(method_dict, n)
+        points_cache.save(key, points, method_dict)
+    return points
+
+
+def generatePoints(method_dict, n):
+
+    if method_dict['method'] == 'qmc':
+        return getPointsQMC(method_dict, n)
 
     if method_dict['uncertain_var'] == 'direction':
         dist = method_dict['distribution']
@@ -30,29 +58,66 @@ def getPoints(method_dict, n):
     return points
 
 
+def getPointsQMC(method_dict, n):
+    """Randomized quasi Monte Carlo points, mapped through the inverse cdfs of the distributions.
+
+    There are method_dict['qmc_replicates'] (default 4) independent scrambles of
+    n points of the method_dict['qmc_sequence'] ('sobol' (default) or 'halton'),
+    seeded by method_dict['qmc_seed'] (default 0). Replicate r are the points
+    r*n to (r+1)*n-1, all the points have the same weight. The spread between
+    the replicates gives the standard error, see statisticsComponents.rqmc_standard_error.
+    """
+
+    sequences = {'sobol': qmc.sobol, 'halton': qmc.halton}
+    sequence = method_dict.get('qmc_sequence', 'sobol')
+    if sequence not in sequences:
+        raise ValueError('unknown qmc_sequence option "%s", valid options "sobol" or "halton".' % sequence)
+    replicates = method_dict.get('qmc_replicates', 4)
+    rng = np.random.RandomState(method_dict.get('qmc_seed', 0))
+
+    uncertain_var = method_dict['uncertain_var']
+    dist = method_dict['distribution']
+    d = 2 if uncertain_var == 'direction_and_speed' else 1
+    U = np.concatenate([sequences[sequence](n, d, rng) for r in range(replicates)])
+    weights = np.ones(U.shape[0])/U.shape[0]
+
+    if uncertain_var == 'direction':
+        winddirections = np.asarray(dist.inv(U[:, 0])).flatten()
+        windspeeds = np.ones(winddirections.size)*method_dict['windspeed_ref']
+    elif uncertain_var == 'speed':
+        windspeeds = np.asarray(dist.inv(U[:, 0])).flatten()
+        winddirections = np.ones(windspeeds.size)*method_dict['winddirection_ref']
+    elif uncertain_var == 'direction_and_speed':
+        winddirections = np.asarray(dist[0].inv(U[:, 0])).flatten()
+        if isinstance(dist, distributions.JointWindRoseWeibull):
+            windspeeds = dist[1].ppf(U[:, 1], winddirections)
+        else:
+            windspeeds = np.asarray(dist[1].inv(U[:, 1])).flatten()
+    else:
+        raise ValueError('unknown uncertain_var option "%s", valid options "speed" or "direction".' %uncertain_var)
+
+    return {'winddirections': winddirections, 'windspeeds': windspeeds, 'weights': weights}
+
+
 def getPointsDirectionSpeed(dist, method_dict, n):
 
+    if isinstance(dist, distributions.JointWindRoseWeibull):
+        return getPointsConditionalSpeed(dist, method_dict, n)
+
     method = method_dict['method']
 
-    if method == 'rect':
+    if method in ['rect', 'nested', 'periodic']:
         dist_dir = dist[0]
         dist_speed = dist[1]
+        if method_dict.get('coeff_method') == 'sparse_grid':
+            # n is the level of the sparse grid
+            return getPointsSparseGrid(dist_dir, dist_speed, method_dict, n)
         winddirections, weights_dir = getPointsDirection(dist_dir, method_dict, n)
         windspeeds, weights_speed = getPointsSpeed(dist_speed, method_dict, n)
 
         # Create a 1-dimensional vector of the tensor product
-        wind_dir = []
-        wind_spd = []
-        weights = []
-        for i in range(winddirections.size):
-            for j in range(windspeeds.size):
-                wind_dir.append(winddirections[i])
-                wind_spd.append(windspeeds[j])
-                weights.append(weights_dir[i]*weights_speed[j])
-
-        winddirections = np.array(wind_dir)
-        windspeeds = np.array(wind_spd)
-        weights = np.array(weights)
+        winddirections, windspeeds, weights = tensorProduct(winddirections, weights_dir,
+                                                            windspeeds, weights_speed)
 
     if method == 'dakota':
 
@@ -87,7 +152,7 @@ def getPointsDirectionSpeed(dist, method_dict, n):
             C = (C + offset) % r
             x_d, f_d = generate_direction_abscissas_ordinates(a_d, A, B, C, r, R, dist_dir)
 
-        if dist_dir._str() == 'Amalia windrose raw':
+        if dist_dir._str() in ['Amalia windrose raw', 'Tabulated windrose']:
 
             C = 225  # Location of max probability or desired starting location.
             R = b_d-a_d  # range 360
@@ -116,12 +181,8 @@ def getPointsDirectionSpeed(dist, method_dict, n):
         dist_speed = dist[1]
         x_s, f_s = generate_speed_abscissas_ordinates(a_s, b_s, dist_speed)
 
-        # Update the dakota file
-        updateDakotaFile(method_dict, n, [x_d, x_s], [f_d, f_s])
-
-        # run Dakota file to get the points locations
-        # This one also needs to work for the 1 and 2d cases.
-        x, w = getSamplePoints(method_dict['dakota_filename'])
+        # Update the dakota file and get the points locations
+        x, w = getDakotaPoints(method_dict, n, [x_d, x_s], [f_d, f_s])
         assert len(x) == 2, 'Should be returning the directions and speeds'
         x_d = np.array(x[0])
         x_s = np.array(x[1])
@@ -132,7 +193,7 @@ def getPointsDirectionSpeed(dist, method_dict, n):
             x_d = R*x_d/2. + R/2. + a_d  # R = 330
             # Call modify x with the new x.
             x_d = modifyx(x_d, A, B, C, r)
-        if dist_dir._str() == 'Amalia windrose raw':
+        if dist_dir._str() in ['Amalia windrose raw', 'Tabulated windrose']:
             # Rescale x
             x_d = R*x_d/2. + R/2. + a_d  # R = 360
             # Call modify x with the new x.
@@ -149,6 +210,125 @@ def getPointsDirectionSpeed(dist, method_dict, n):
     return winddirections, windspeeds, weights
 
 
+def tensorProduct(winddirections, weights_dir, windspeeds, weights_speed):
+    """1-dimensional vectors of the tensor product of the direction and speed rules.
+
+    The speeds vary the fastest.
+    """
+
+    D, S = np.meshgrid(winddirections, windspeeds, indexing='ij')
+    W = np.outer(weights_dir, weights_speed)
+    return D.ravel(), S.ravel(), W.ravel()
+
+
+def getPointsSparseGrid(dist_dir, dist_speed, method_dict, level):
+    """Smolyak sparse grid of the direction and speed rect or nested rules.
+
+    The rect 1d rules of level l have 3**l bins, so the midpoints of a level are
+    also midpoints of the next one (for the directions only without offset).
+    For the nested method the 1d rules of level l are those of getPoints with n = l.
+    The grid is built with the combination technique
+
+        Q = sum_{i+j=level} Q_i x Q_j - sum_{i+j=level-1} Q_i x Q_j
+
+    and the points shared by several tensor grids are merged, adding their weights.
+    The weights can be negative.
+
+    The 1d rules are normalized to sum to 1 before combining. The coarse rect
+    direction bins straddle the zero region of the wind rose, so their weights
+    do not add up to 1 (0.876 and 0.926 for levels 0 and 1 of the Amalia rose),
+    and without the normalization the sparse grid would not integrate a function
+    of only one of the variables as its finest 1d rule does.
+    """
+
+    if method_dict['method'] == 'rect':
+        size = lambda l: 3**l
+    elif method_dict['method'] == 'nested':
+        size = lambda l: l
+    else:
+        raise ValueError('The sparse grid is only implemented for the "rect" and "nested" methods.')
+    rules_dir = [getPointsDirection(dist_dir, method_dict, size(l)) for l in range(level+1)]
+    rules_speed = [getPointsSpeed(dist_speed, method_dict, size(l)) for l in range(level+1)]
+    rules_dir = [(x, w/np.sum(w)) for x, w in rules_dir]
+    rules_speed = [(x, w/np.sum(w)) for x, w in rules_speed]
+
+    winddirections = []
+    windspeeds = []
+    weights = []
+    for q, coefficient in [(level, 1.0), (level-1, -1.0)]:
+        for i in range(q+1):
+            x_d, w_d = rules_dir[i]
+            x_s, w_s = rules_speed[q-i]
+            D, S, W = tensorProduct(x_d, w_d, x_s, w_s)
+            winddirections.append(D)
+            windspeeds.append(S)
+            weights.append(coefficient*W)
+    winddirections = np.concatenate(winddirections)
+    windspeeds = np.concatenate(windspeeds)
+    weights = np.concatenate(weights)
+
+    return mergePoints(winddirections, windspeeds, weights)
+
+
+def mergePoints(winddirections, windspeeds, weights):
+    """Merge the repeated points, adding their weights.
+
+    The same point may differ in the last digits when it comes from different rules.
+    """
+
+    points = np.round(np.column_stack([winddirections, windspeeds]), 8)
+    unused, index, inverse = np.unique(points, axis=0, return_index=True, return_inverse=True)
+    weights = np.bincount(inverse.flatten(), weights=weights)
+
+    return winddirections[index], windspeeds[index], weights
+
+
+def getPointsConditionalSpeed(dist, method_dict, n):
+    """Points for the joint distribution where the speed depends on the direction.
+
+    The directions use the 1d rule of the method. For each direction the speeds
+    are the n point Gauss rule of the conditional weibull, computed for all the
+    directions at once, unless method_dict['speed_rule'] is 'rect' for the midpoints
+    of n bins. The statistics are weighted sums, so only the 'rect' method
+    (RectStatistics) is supported. The truncation of the speeds is different
+    for each direction sector, the speed weights of each direction carry it
+    relative to the average truncation modify_statistics corrects for.
+    """
+
+    if method_dict['method'] != 'rect':
+        raise ValueError('The direction conditional weibull is only implemented for the "rect" method.')
+
+    dist_dir = dist[0]
+    dist_speed = dist[1]
+    winddirections, weights_dir = getPointsDirection(dist_dir, method_dict, n)
+    a, b = dist_speed.bnd()
+
+    if method_dict.get('speed_rule', 'gauss') == 'rect':
+        X = np.linspace(a, b, n+1)
+        dx = X[1]-X[0]
+        x = X[:-1]+dx/2  # Take the midpoints of the bins
+        F = dist_speed.cdf(X[None, :], winddirections[:, None])
+        speeds = np.tile(x, (winddirections.size, 1))
+        weights_speed = np.diff(F, axis=1)
+    else:
+        # Discretize the conditional pdf for every direction and get all the Gauss rules together
+        t, dt = quadrature.composite_gauss_legendre(a, b)
+        lam = dist_speed.pdf(t[None, :], winddirections[:, None]) * dt
+        lam = lam / np.sum(lam, axis=1)[:, None]
+        speeds, weights_speed = quadrature.gauss(t, lam, n)
+
+    # Account for the truncation of each sector, (1-k)*mean in modify_statistics
+    # then gives the mean of the truncated probability of each direction.
+    k = dist_speed.truncation(winddirections)
+    weights_speed = weights_speed * ((1.0-k)/(1.0-dist_speed.get_truncation_value()))[:, None]
+
+    winddirections = np.repeat(winddirections, speeds.shape[1])
+    windspeeds = speeds.flatten()
+    weights = (weights_dir[:, None] * weights_speed).flatten()
+
+    return winddirections, windspeeds, weights
+
+
 def getPointsModifiedAmaliaDistribution(dist, method_dict, n):
 
     # Modify the input range to start at max probability location
@@ -201,9 +381,8 @@ def getPointsModifiedAmaliaDistribution(dist, method_dict, n):
         offset = i*r/N  # the offset modifies the starting point for N locations within the whole interval
         C = (C + offset) % r
         x, f = generate_direction_abscissas_ordinates(a, A, B, C, r, R, dist)
-        updateDakotaFile(method_dict, n, x, f)
-        # run Dakota file to get the points locations
-        x, w = getSamplePoints(method_dict['dakota_filename'])
+        # Update the dakota file and get the points locations
+        x, w = getDakotaPoints(method_dict, n, x, f)
         assert len(x) == 1, 'Should only be returning the directions'
         x = np.array(x[0])
         # Rescale x
@@ -266,9 +445,8 @@ def getPointsRawAmaliaDistribution(dist, method_dict, n):
         # Modify y to -1 to 1 range, I think makes dakota generation of polynomials easier
         x = 2*(y-a) / R - 1
 
-        updateDakotaFile(method_dict, n, x, f)
-        # run Dakota file to get the points locations
-        x, w = getSamplePoints(method_dict['dakota_filename'])
+        # Update the dakota file and get the points locations
+        x, w = getDakotaPoints(method_dict, n, x, f)
         assert len(x) == 1, 'Should only be returning the directions'
         x = np.array(x[0])
         # Rescale x
@@ -286,9 +464,15 @@ def getPointsRawAmaliaDistribution(dist, method_dict, n):
 
 def getPointsDirection(dist, method_dict, n):
 
+    if method_dict['method'] == 'nested':
+        return getPointsNestedDirection(dist, method_dict, n)
+    if method_dict['method'] == 'periodic':
+        return getPointsPeriodicDirection(dist, method_dict, n)
+
     if dist._str() == 'Amalia windrose':
         x, w = getPointsModifiedAmaliaDistribution(dist, method_dict, n)
-    if dist._str() == 'Amalia windrose raw':
+    if dist._str() in ['Amalia windrose raw', 'Tabulated windrose']:
+        # Any tabulated wind rose is treated as the raw amalia, there is no zero probability region.
         x, w = getPointsRawAmaliaDistribution(dist, method_dict, n)
 
     return x, w
@@ -303,7 +487,7 @@ def getPointsSpeed(dist, method_dict, n):
     a = a[0]  # get rid of the list
     b = b[0]  # get rid of the list
 
-    if method == 'rect':
+    if method in ['rect', 'periodic']:  # The speed is not periodic, periodic uses the rect speeds
 
         X = np.linspace(a, b, n+1)
         dx = X[1]-X[0]
@@ -318,15 +502,17 @@ def getPointsSpeed(dist, method_dict, n):
     if method == 'dakota':
 
         x, f = generate_speed_abscissas_ordinates(a, b, dist)
-        updateDakotaFile(method_dict, n, x, f)
-        # run Dakota file to get the points locations
-        x, w = getSamplePoints(method_dict['dakota_filename'])
+        # Update the dakota file and get the points locations
+        x, w = getDakotaPoints(method_dict, n, x, f)
         assert len(x) == 1, 'Should only be returning the speeds'
         x = np.array(x[0])
 
         # Rescale x
         x = (b-a)/2. + (b-a)/2.*x + a
 
+    if method == 'nested':
+        x, w = getPointsNestedSpeed(dist, method_dict, n)
+
     if method == 'chaospy':
         x, w = cp.generate_quadrature(n-1, dist, rule='G')
         x = x[0]
@@ -334,6 +520,251 @@ def getPointsSpeed(dist, method_dict, n):
     return x, w
 
 
+def getDirectionMap(dist, method_dict):
+    """The coordinate y in [0, R] used by the nested direction rules and its map to the direction.
+
+    y = 0 is the max probability location C, moved by the offset like in the
+    dakota method. For the amalia windrose the map skips the zero probability region.
+
+    Returns:
+        R (float): the range of y
+        todirection (function): maps y to the wind direction
+    """
+
+    bnd = dist.range()
+    a = bnd[0][0]  # left boundary
+    b = bnd[1][0]  # right boundary
+    r = b-a  # original range
+
+    C = 225  # Location of max probability or desired starting location
+    N = method_dict['Noffset']  # N = 10
+    i = method_dict['offset']  # i = [0, 1, 2, N-1]
+    C = (C + i*r/N) % r
+
+    if dist._str() == 'Amalia windrose':
+        A, B = dist.get_zero_probability_region()
+        R = r - (B-A)  # modified range
+        todirection = lambda y: modifyx(y + a, A, B, C, r)
+    else:
+        R = r
+        todirection = lambda y: (y + a + C) % R
+
+    return R, todirection
+
+
+def getNestedRule(pdf, lo, hi, method_dict, level):
+    """Points and weights of the nested rule of the given level, for the pdf on [lo, hi].
+
+    method_dict['nested_rule']:
+        'clenshaw_curtis' 2**level+1 points (1 for level 0), all the points of a level are in the next one.
+        'kronrod' level 0 is the Gauss rule with method_dict['kronrod_points'] (default 5),
+                  level 1 its Gauss-Kronrod extension. There are no further levels for a general pdf.
+    """
+
+    rule = method_dict.get('nested_rule', 'clenshaw_curtis')
+    # Discretize the pdf
+    t, dt = quadrature.composite_gauss_legendre(lo, hi)
+    lam = pdf(t) * dt
+
+    if rule == 'clenshaw_curtis':
+        m = 0 if level == 0 else 2**level
+        x, w = quadrature.clenshaw_curtis(t, lam, m, lo, hi)
+    elif rule == 'kronrod':
+        n = method_dict.get('kronrod_points', 5)
+        if level == 0:
+            x, w = quadrature.gauss(t, lam, n)
+        elif level == 1:
+            x, w = quadrature.kronrod(t, lam, n)
+        else:
+            raise ValueError('The kronrod nested rule only has levels 0 and 1, not %s.' % level)
+    else:
+        raise ValueError('unknown nested_rule option "%s", valid options "clenshaw_curtis", "kronrod" or "dyadic".' % rule)
+
+    return x, w
+
+
+def getPointsNestedDirection(dist, method_dict, level):
+    """Directions of the nested rule of the given level.
+
+    The 'dyadic' rule has 2**level equally spaced points, each in the middle of
+    its bin. As the direction is periodic, the points of a level are every
+    other point of the next level.
+    """
+
+    R, todirection = getDirectionMap(dist, method_dict)
+
+    if method_dict.get('nested_rule', 'clenshaw_curtis') == 'dyadic':
+        m = 2**level
+        dx = R/float(m)
+        x = todirection(np.arange(m)*dx)
+        w = getWeights(x, dx, dist)
+    else:
+        y, w = getNestedRule(lambda y: dist.pdf(todirection(y)), 0.0, R, method_dict, level)
+        x = todirection(y)
+        # The first and last points are the same direction
+        x, unused, w = mergePoints(x, np.zeros(x.size), w)
+
+    return x, w
+
+
+def getPointsNestedSpeed(dist, method_dict, level):
+    """Speeds of the nested rule of the given level.
+
+    The 'dyadic' rule has the midpoint for level 0 and otherwise 2**level+1
+    equally spaced points including the ends, each in the middle of its bin.
+    """
+
+    bnd = dist.range()
+    a = bnd[0][0]  # lower boundary
+    b = bnd[1][0]  # upper boundary
+
+    if method_dict.get('nested_rule', 'clenshaw_curtis') == 'dyadic':
+        if level == 0:
+            x = np.array([(a+b)/2.])
+            dx = b-a
+        else:
+            m = 2**level
+            dx = (b-a)/float(m)
+            x = a + np.arange(m+1)*dx
+        w = dist._cdf(np.minimum(x+dx/2., b)) - dist._cdf(np.maximum(x-dx/2., a))
+        w = np.asarray(w).flatten()
+    else:
+        x, w = getNestedRule(dist.pdf, a, b, method_dict, level)
+
+    return x, w
+
+
+def getPointsAdaptive(dist, method_dict, n, power):
+    """Directions with bins refined where the curvature of the power is the largest.
+
+    Starts from n equal bins in the coordinate y of getDirectionMap. The weights
+    are the probabilities of the bins, which add up to one. The error estimate
+    of a bin is that of the midpoint rule, its weight times h**2 |p''| / 24,
+    with h the width of the bin and p'' the second divided difference of the
+    powers of the bin and its neighbors. The bins with the largest errors are
+    split in three, which keeps their midpoint, so the power already computed
+    there is reused. Stops when the sum of the errors is below
+    method_dict['adaptive_tol'] (default 1e-3) times the mean power, or at
+    method_dict['adaptive_max'] (default 100) bins.
+    A dip narrower than the initial bins can fall between two directions and
+    go unnoticed, so n should resolve the narrowest wake (e.g. 20 to 36 bins).
+
+    Args:
+        power (function): the power at an array of directions
+
+    Returns:
+        x, w, p (np.array): the directions, their weights and their powers
+    """
+
+    if method_dict['uncertain_var'] != 'direction':
+        raise ValueError('The adaptive method is only implemented for the uncertain_var "direction".')
+
+    tol = method_dict.get('adaptive_tol', 1e-3)
+    max_bins = method_dict.get('adaptive_max', 100)
+    R, todirection = getDirectionMap(dist, method_dict)
+
+    width = np.ones(n)*R/n
+    center = (np.arange(n)+0.5)*width
+
+    while True:
+        x = todirection(center)
+        # The probability of each bin, y to direction keeps the order around the circle
+        x_left = todirection(center - width/2.)
+        x_right = todirection(center + width/2.)
+        cdf = np.asarray(dist._cdf(np.concatenate([x_left, x_right]))).flatten()
+        w = cdf[center.size:] - cdf[:center.size] + (x_right <= x_left)  # Add 1 if the bin crosses 360
+        w = np.maximum(w, 0.0)
+        p = power(x)
+        mean = np.sum(w*p)
+
+        # Second divided difference with the neighbors around the circle
+        h_left = (center - np.roll(center, 1)) % R
+        h_right = (np.roll(center, -1) - center) % R
+        slope_left = (p - np.roll(p, 1))/h_left
+        slope_right = (np.roll(p, -1) - p)/h_right
+        curvature = 2*(slope_right - slope_left)/(h_left + h_right)
+        error = w*width**2*np.abs(curvature)/24.
+        room = (max_bins - center.size)//2  # Bins we can still split
+        if np.sum(error) <= tol*abs(mean) or room < 1:
+            break
+
+        # Split the worst quarter of the bins
+        split = np.argsort(error)[::-1][:min(max(1, center.size//4), room)]
+        width[split] = width[split]/3.
+        center = np.concatenate([center, center[split]-width[split], center[split]+width[split]])
+        width = np.concatenate([width, width[split], width[split]])
+        order = np.argsort(center)
+        center = center[order]
+        width = width[order]
+
+    return x, w, p
+
+
+def getPointsPeriodicDirection(dist, method_dict, n):
+    """Directions for the periodic method, n points equally spaced around the circle.
+
+    method_dict['periodic_weights']:
+        'pdf' (default) the points start at C, moved by offset/Noffset of the
+              spacing. The weights integrate the trigonometric interpolant of the
+              power against the pdf, which converges spectrally for a smooth periodic
+              power. See approximate.get_fourier_approximation for the interpolant.
+        'importance' the points are equally spaced in probability, starting at C,
+              and have equal weights.
+    """
+
+    bnd = dist.range()
+    a = bnd[0][0]  # left boundary
+    b = bnd[1][0]  # right boundary
+    r = b-a  # range 360
+
+    C = 225  # Location of max probability or desired starting location.
+    N = method_dict['Noffset']  # N = 10
+    i = method_dict['offset']  # i = [0, 1, 2, N-1]
+
+    weighting = method_dict.get('periodic_weights', 'pdf')
+    if weighting == 'pdf':
+        dx = r/float(n)
+        x = (C + i*dx/N + np.arange(n)*dx) % r + a
+        # Fourier coefficients of the distribution, from the cdf
+        F = np.asarray(dist._cdf(np.linspace(a, b, 3601))).flatten()
+        phi = quadrature.characteristic_coefficients(F, n//2)
+        w = quadrature.fourier_weights(2*np.pi*(x-a)/r, phi)
+    elif weighting == 'importance':
+        F_C = np.asarray(dist._cdf(np.array([C + a]))).flatten()[0]
+        u = (F_C + (np.arange(n) + i/float(N))/n) % 1.0
+        x = np.asarray(dist.inv(u)).flatten()
+        w = np.ones(n)/n
+    else:
+        raise ValueError('unknown periodic_weights option "%s", valid options "pdf" or "importance".' % weighting)
+
+    return x, w
+
+
+def getDakotaPoints(method_dict, n, x, f):
+    """Get the points and weights of the histogram bins, writing the Dakota file when Dakota uses it.
+
+    The histogram bins, as Dakota reads them, and the quadrature points and
+    weights are kept in method_dict['dakota_histogram'] for the in process
+    statistics. With
+    method_dict['points_backend'] = 'numpy' the quadrature points are computed
+    here instead of calling Dakota. They are not those of Dakota, they differ
+    by up to numpy_points_tolerance (1e-4) relative, so the results of the
+    two backends are not interchangeable. Dakota is the default. The Dakota
+    file is only written when Dakota runs, for the points or for the statistics.
+    """
+
+    method_dict['dakota_histogram'] = getHistogramBins(x, f, n)
+    if dakotaInputNeeded(method_dict):
+        updateDakotaFile(method_dict, n, x, f)
+    if method_dict.get('points_backend', 'dakota') == 'numpy':
+        print 'The numpy quadrature points differ from those of Dakota by up to %g relative' % numpy_points_tolerance
+        x, w = getSamplePointsNumpy(method_dict['dakota_histogram'], method_dict['coeff_method'])
+    else:
+        x, w = getSamplePoints(getDakotaInput(method_dict))
+    method_dict['dakota_histogram']['points'] = np.array(x, dtype=float)
+    method_dict['dakota_histogram']['weights'] = np.asarray(w)
+    return x, w
+
 def generate_direction_abscissas_ordinates(a, A, B, C, r, R, dist):
 
     # Use the y to set the abscissas, and the pdf to set the ordinates
@@ -368,37 +799,33 @@ def modifyx(x, A=110, B=140, C=225, r=360):
         C = min([A, B], key=lambda x: abs(x-C))  # It doesn't really matter if C gets set to A or B
 
     # Modify x, to start from the max probability location
-    x = (x+C) % r
-    y = []
-    for xi in x:
-        if A<C:
-            if xi > A and xi < C:
-                xi = (xi + B-A) % r  # I don't think the mod r is necessary for all of these.
-            y.append(xi)
-        else:
-            if xi > A:
-                xi = (xi + B-A) % r
-            else:
-                if xi < C:
-                    xi = (xi + B-A) % r
-            y.append(xi)
-    return np.array(y)
+    x = (np.asarray(x)+C) % r
+    if A<C:
+        mask = (x > A) & (x < C)
+    else:
+        mask = (x > A) | (x < C)
+    y = np.where(mask, (x + B-A) % r, x)  # I don't think the mod r is necessary for all of these.
+    return y
 
 
 def getWeights(x, dx, dist):
     # Logic to get the weights from integrating the pdf between the bins
-    w = []
-    for xi in x:
-        xleft = xi-dx/2.
-        xright = xi+dx/2.
-        if xright > 360.0:
-            w.append(1 - dist._cdf(xleft) + dist._cdf(xright-360))
-        elif xleft < 0.0:
-            w.append(dist._cdf(xright) + (1 - dist._cdf(360+xleft)))
-        else:
-            w.append(dist._cdf(xright) - dist._cdf(xleft))
-        # print xi+dx/2., xi-dx/2.
-    w = np.array(w).flatten()
+    x = np.asarray(x)
+    xleft = x-dx/2.
+    xright = x+dx/2.
+    # Bins that wrap around 360
+    over = xright > 360.0
+    under = (xleft < 0.0) & ~over
+
+    # Evaluate the cdf at all the bin edges at once
+    cdf = dist._cdf(np.concatenate([np.where(under, 360+xleft, xleft),
+                                    np.where(over, xright-360, xright)]))
+    cdf = np.asarray(cdf).flatten()
+    cdf_left = cdf[:x.size]
+    cdf_right = cdf[x.size:]
+
+    w = np.where(over, 1 - cdf_left + cdf_right,
+                 np.where(under, cdf_right + (1 - cdf_left), cdf_right - cdf_left))
     # print w  # all weights should be positive
     # print np.sum(w)   # this should sum to 1
     return w